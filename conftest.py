@@ -0,0 +1,2 @@
+# test_script1.py - стартовый скрипт эмулятора (команды оболочки), а не тесты pytest
+collect_ignore = ['test_script1.py']
@@ -0,0 +1,249 @@
+import tkinter as tk
+from tkinter import scrolledtext
+import socket
+import getpass
+import os
+import queue
+import threading
+
+from shell_engine import ShellEngine, ScriptRunner, DEFAULT_CACHE_MB
+from vfs import VFS
+
+SCRIPT_SLICE_SECONDS = 0.02  # сколько времени скрипт может занимать цикл событий за один такт
+DEFAULT_SCROLLBACK = 10000  # сколько последних строк хранит поле вывода
+LOAD_POLL_MS = 50  # как часто главный поток проверяет очередь фоновой загрузки
+
+
+class OSEmulator:
+    def __init__(self, root, vfs_path=None, script_path=None, cache_mb=DEFAULT_CACHE_MB, script_delay_ms=0,
+                 scrollback=DEFAULT_SCROLLBACK, watch=None):
+        self.root = root  # сохраняем ссылку на главное окно приложения
+        self.root.title(f"Эмулятор - [{getpass.getuser()}@{socket.gethostname()}]")  # получаем имя пользователя и hostname и устанавливаем их как заголовок
+        self.root.geometry("800x500")  # устанавливаем размеры
+        self.root.minsize(800, 500)  # устанавливаем минимальный размер окна
+
+        self.vfs_path = vfs_path  # сохраняем путь к виртуальной файловой системе
+        self.script_path = script_path  # сохраняем путь к стартовому скрипту
+        self.cache_bytes = int(cache_mb * 1024 * 1024)  # бюджет кэша раскодированного содержимого
+        self.script_delay_ms = script_delay_ms  # пауза между командами скрипта, 0 - без пауз
+        self.script_runner = None  # исполнитель стартового скрипта
+        self.scrollback = scrollback  # предел строк в поле вывода, 0 - без ограничения
+        self.pending_output = []  # вывод, накопленный до ближайшего такта простоя
+        self.pending_lines = 0  # число строк в pending_output
+        self.flush_scheduled = False
+        self.loading = False  # VFS загружается в фоновом потоке
+        self.load_queue = queue.Queue()  # сообщения фонового потока для главного потока
+        self.deferred_commands = []  # команды, введенные до окончания загрузки
+        self.script_pending = False  # скрипт ждет окончания загрузки
+        self.watch_ms = int(watch * 1000) if watch else 0  # период проверки файла VFS, 0 - не следить
+        self.reloading = False  # новая версия образа разбирается в фоновом потоке
+        self.reload_queue = queue.Queue()
+
+        self.output_area = scrolledtext.ScrolledText(  # создаем текстовое поле с прокруткой для вывода
+            root,
+            wrap=tk.WORD,  # перенос текста
+            state='disabled'  # блокируем пользователю возможность редактировать
+        )
+        self.output_area.pack(expand=True, fill='both', padx=10, pady=10)  # заполняем виджетом все пространство, отступ 10
+
+        self.input_entry = tk.Entry(  # создаем поле для ввода команд
+            root,
+            font=("Courier", 12)  # устанавливаем шрифт для поля ввода
+        )
+        self.input_entry.pack(fill='x', padx=10, pady=5)  # размещение поля и отступ
+        self.input_entry.bind("<Return>", self.process_command)  # привязываем обработчик нажатия Enter к функции process_command
+
+        self.engine = ShellEngine(self.display_message)  # вся логика команд живет в движке, окно только выводит
+
+        # выводим информацию о параметрах запуска
+        self.display_message("=== Параметры запуска ===\n")
+        self.display_message(f"VFS путь: {vfs_path if vfs_path else 'не указан'}\n")
+        self.display_message(f"Скрипт: {script_path if script_path else 'не указан'}\n")
+        self.display_message("=======================\n\n")
+
+        if self.vfs_path:  # если указан путь к VFS, загружаем ее в фоне, окно доступно сразу
+            self.start_vfs_loading()
+
+        self.display_message("Добро пожаловать в эмулятор командной оболочки OC.\nВведите команду (например, ls, cd, pwd, cat).\nВведите exit для выхода. Для получения информации о командах, введите help.")
+
+        # если указан скрипт, планируем его запуск через 100 мс после инициализации GUI
+        if self.script_path:
+            self.root.after(100, self.run_startup_script)  # after()
+
+    def start_vfs_loading(self):
+        if not os.path.exists(self.vfs_path):  # проверяем существование файла VFS
+            self.display_message(f"Ошибка: VFS файл '{self.vfs_path}' не найден\n")
+            return
+
+        self.loading = True
+        self.display_message(f"Загрузка VFS из '{self.vfs_path}'...\n")
+        threading.Thread(target=self.load_vfs_worker, daemon=True).start()
+        self.root.after(LOAD_POLL_MS, self.poll_vfs_loading)
+
+    def load_vfs_worker(self):
+        # выполняется в фоновом потоке: к виджетам не обращается, все передает через очередь
+        reported = [0]
+
+        def progress(fraction):
+            percent = int(fraction * 10) * 10  # сообщаем с шагом 10%
+            if percent > reported[0]:
+                reported[0] = percent
+                self.load_queue.put(('progress', percent))
+
+        phases = {} if self.engine.stats.enabled else None  # фазы загрузки запишет главный поток
+        try:
+            vfs = VFS.load(self.vfs_path, progress=progress, phases=phases, cache_bytes=self.cache_bytes,
+                           checksums=bool(self.watch_ms))  # crc32 содержимого нужны для сравнения версий
+        except Exception as e:
+            self.load_queue.put(('error', e))
+        else:
+            self.load_queue.put(('done', (vfs, phases)))
+
+    def poll_vfs_loading(self):
+        # главный поток забирает сообщения загрузчика через цикл событий Tk
+        while True:
+            try:
+                kind, value = self.load_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.display_message(f"Загрузка VFS: {value}%\n")
+            else:
+                if kind == 'done':
+                    vfs, phases = value
+                    self.engine.attach_vfs(vfs, self.vfs_path, phases)
+                else:
+                    self.engine.report_load_error(value)
+                self.finish_vfs_loading()
+                return
+        self.root.after(LOAD_POLL_MS, self.poll_vfs_loading)
+
+    def finish_vfs_loading(self):
+        self.loading = False
+        if self.watch_ms and self.engine.vfs_index is not None:
+            self.root.after(self.watch_ms, self.watch_vfs)
+        commands, self.deferred_commands = self.deferred_commands, []
+        for command_input in commands:  # выполняем команды, отложенные на время загрузки
+            self.engine.execute(command_input)
+            if self.engine.exit_requested:
+                self.root.quit()
+                return
+        if self.script_pending:
+            self.script_pending = False
+            self.run_startup_script()
+
+    def watch_vfs(self):
+        # по таймеру проверяем только stat файла; новую версию разбираем в фоне, как при загрузке
+        if not self.reloading and self.engine.vfs_index.image_changed():
+            self.reloading = True
+            threading.Thread(target=self.reload_worker, daemon=True).start()
+            self.root.after(LOAD_POLL_MS, self.poll_reload)
+        self.root.after(self.watch_ms, self.watch_vfs)
+
+    def reload_worker(self):
+        # выполняется в фоновом потоке: только читает индекс и новый файл
+        try:
+            diff = self.engine.vfs_index.diff_image()
+        except Exception as e:
+            self.reload_queue.put(('error', e))
+        else:
+            self.reload_queue.put(('diff', diff))
+
+    def poll_reload(self):
+        try:
+            kind, value = self.reload_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(LOAD_POLL_MS, self.poll_reload)
+            return
+        self.reloading = False
+        if kind == 'error':
+            self.engine.report_reload_error(value)
+        elif value is not None:  # разница применяется в главном потоке, между командами
+            self.engine.apply_image_diff(value)
+
+    def display_message(self, message):  # метод для вывода на экран
+        # сообщение только попадает в буфер, виджет обновляется один раз за такт простоя
+        self.pending_output.append(message)
+        self.pending_lines += message.count('\n')
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.root.after_idle(self.flush_output)
+
+    def flush_output(self):
+        """Вывод накопленного буфера в текстовое поле одной вставкой"""
+        self.flush_scheduled = False
+        text = ''.join(self.pending_output)
+        if self.scrollback and self.pending_lines > self.scrollback:
+            # строки, которые все равно будут обрезаны, в виджет не вставляем
+            cut = len(text)
+            for _ in range(self.scrollback + 1):
+                cut = text.rfind('\n', 0, cut)
+            text = text[cut + 1:]
+        self.pending_output = []
+        self.pending_lines = 0
+
+        self.output_area.config(state='normal')  # включаем режим редактирования поля
+        self.output_area.insert(tk.END, text)  # вставляем накопленный текст в конец текстового поля
+        if self.scrollback:
+            # кольцевой буфер: удаляем самые старые строки сверх предела
+            excess = int(self.output_area.index('end-1c').split('.')[0]) - self.scrollback
+            if excess > 0:
+                self.output_area.delete('1.0', f'{excess + 1}.0')
+        self.output_area.see(tk.END)  # автоматически прокручиваем текстовое поле к концу
+        self.output_area.config(state='disabled')  # блокируем режим редактирования поля
+
+    def process_command(self, event):  # метод для парсинга
+        command_input = self.input_entry.get().strip()  # получаем то что ввелось и обрезаем лишние пробелы
+        self.input_entry.delete(0, tk.END)  # очищаем поле ввода
+
+        if not command_input:  # если введеная строка пустая, то выходим из функции
+            return
+
+        if self.loading and command_input.split()[0] != "exit":  # до загрузки VFS команды ставим в очередь
+            self.deferred_commands.append(command_input)
+            self.display_message(f"Команда '{command_input}' будет выполнена после загрузки VFS\n")
+            return
+
+        self.engine.execute(command_input)  # разбор и выполнение команды движком
+        if self.engine.exit_requested:  # если введена команда exit, выходим из эмулятора
+            self.root.quit()
+
+    def run_startup_script(self):
+        if self.loading:  # скрипт запустится, когда VFS загрузится
+            self.script_pending = True
+            return
+
+        if not self.script_path or not os.path.exists(self.script_path):  # проверяем путь и существование файла
+            self.display_message(f"Ошибка: скрипт '{self.script_path}' не найден\n")
+            return
+
+        self.display_message(f"\n=== Выполнение скрипта: {self.script_path} ===\n")  # заголовок начала выполнения скрипта
+
+        try:  # обрабатываем ошибки
+            with open(self.script_path, 'r', encoding='utf-8') as file:
+                lines = file.readlines()
+        except Exception as e:  # перехват исключений
+            self.display_message(f"Ошибка при выполнении скрипта: {str(e)}\n")
+            return
+
+        self.script_runner = ScriptRunner(self.engine, lines)
+        self.run_script_slice()
+
+    def run_script_slice(self):
+        # одна порция скрипта за такт цикла событий, между порциями окно успевает обработать ввод и перерисовку
+        try:
+            if self.script_delay_ms:  # демонстрационный режим: одна команда за такт
+                self.script_runner.run_slice(max_commands=1)
+            else:
+                self.script_runner.run_slice(time_budget=SCRIPT_SLICE_SECONDS)
+        except Exception as e:  # перехват исключений
+            self.display_message(f"Ошибка при выполнении скрипта: {str(e)}\n")
+            return
+
+        if self.engine.exit_requested:
+            self.display_message("Завершение работы по скрипту...\n")
+            self.root.after(1000, self.root.quit)  # завершаем программу через 1 секунду
+        elif self.script_runner.done:
+            self.display_message("=== Выполнение скрипта завершено ===\n\n")
+        else:
+            self.root.after(self.script_delay_ms or 1, self.run_script_slice)
@@ -0,0 +1,117 @@
+import gc
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import vfs_search
+from shell_engine import ShellEngine, ScriptRunner, DEFAULT_CACHE_MB
+from vfs import VFS
+
+STATUS_OK = 0  # скрипт выполнен без ошибок
+STATUS_ERRORS = 1  # были сообщения об ошибках команд
+STATUS_FAILED = 2  # скрипт не прочитан или выполнение прервано исключением
+
+_worker_vfs = None  # VFS процесса-исполнителя: при fork достается от родителя без копирования
+
+
+def _init_worker(vfs_path, cache_bytes, index=False):
+    # без fork (spawn на Windows и macOS) каждый исполнитель загружает образ сам; бинарный образ - это только mmap
+    global _worker_vfs
+    if _worker_vfs is None and vfs_path:
+        _worker_vfs = VFS.load(vfs_path, cache_bytes=cache_bytes)
+        _worker_vfs.read_only = True
+        if index:
+            _worker_vfs.text_index = vfs_search.TrigramIndex.build(_worker_vfs)
+
+
+def expand_scripts(patterns, stdout=None):
+    """Список скриптов по путям и шаблонам glob, без повторов, в порядке аргументов"""
+    stdout = stdout or sys.stdout
+    scripts = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:  # опечатка в шаблоне не должна пройти незаметно
+            stdout.write(f"Нет файлов по шаблону '{pattern}'\n")
+        for path in matches:
+            if path not in scripts:
+                scripts.append(path)
+    return scripts
+
+
+def run_script(job):
+    """Выполнение одного скрипта в новой сессии; вывод пишется в свой файл протокола"""
+    script_path, transcript_path = job
+    started = time.perf_counter()
+    result = {'script': script_path, 'transcript': transcript_path, 'commands': 0, 'errors': 0}
+    with open(transcript_path, 'w', encoding='utf-8') as transcript:
+        engine = ShellEngine(transcript.write, vfs=_worker_vfs)  # своя текущая папка у каждого скрипта
+        try:
+            with open(script_path, 'r', encoding='utf-8') as file:
+                lines = file.readlines()
+            result['commands'] = ScriptRunner(engine, lines).run_slice()
+            if engine.exit_requested:
+                transcript.write("Завершение работы по скрипту...\n")
+        except Exception as e:  # ошибка одного скрипта не останавливает остальные
+            transcript.write(f"Ошибка при выполнении скрипта: {str(e)}\n")
+            result['status'] = STATUS_FAILED
+        else:
+            result['status'] = STATUS_ERRORS if engine.errors else STATUS_OK
+    result['errors'] = engine.errors
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def run_batch(vfs_path, scripts, out_dir, jobs=None, cache_mb=DEFAULT_CACHE_MB, stdout=None, index=False):
+    """Прогон скриптов пулом процессов; возвращает 0 если все скрипты прошли без ошибок"""
+    global _worker_vfs
+    stdout = stdout or sys.stdout
+    if not scripts:  # пустой прогон не считается успешным
+        stdout.write("Ошибка: нет скриптов для выполнения\n")
+        return STATUS_FAILED
+    jobs = jobs or os.cpu_count() or 1
+    cache_bytes = int(cache_mb * 1024 * 1024)
+    os.makedirs(out_dir, exist_ok=True)
+
+    loader = ShellEngine(stdout.write)  # образ загружается один раз, до создания пула
+    if vfs_path:
+        loader.load_vfs(vfs_path, cache_bytes=cache_bytes)
+        if loader.vfs_index is None:  # ошибка загрузки уже выведена
+            return STATUS_FAILED
+        if index:  # при fork исполнители получают готовый индекс вместе с образом
+            loader.cmd_index([])
+    _worker_vfs = loader.vfs_index
+    if _worker_vfs is not None:  # скрипты не должны видеть изменения друг друга и писать в общий журнал
+        _worker_vfs.read_only = True
+
+    job_list = [(script, os.path.join(out_dir, f"{i:04d}_{os.path.basename(script)}.log"))
+                for i, script in enumerate(scripts)]
+    started = time.perf_counter()
+    if jobs == 1:  # без пула: нет затрат на процессы
+        results = [run_script(job) for job in job_list]
+    else:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            gc.freeze()  # объекты индекса уходят из-под сборщика, и его обходы не копируют страницы
+        else:
+            context = multiprocessing.get_context()
+        try:
+            with context.Pool(jobs, initializer=_init_worker, initargs=(vfs_path, cache_bytes, index)) as pool:
+                results = list(pool.imap(run_script, job_list, chunksize=max(1, len(job_list) // (jobs * 8))))
+        finally:
+            gc.unfreeze()
+    elapsed = time.perf_counter() - started
+
+    failed = [result for result in results if result['status'] != STATUS_OK]
+    for result in failed:
+        stdout.write(f"{'ОШИБКИ' if result['status'] == STATUS_ERRORS else 'СБОЙ'}: {result['script']} "
+                     f"({result['errors']} ошибок, протокол {result['transcript']})\n")
+    stdout.write(f"Скриптов: {len(results)}, без ошибок: {len(results) - len(failed)}, "
+                 f"процессов: {jobs}, время: {elapsed:.2f} с ({len(results) / elapsed if elapsed else 0:.1f} скриптов/с)\n")
+
+    with open(os.path.join(out_dir, 'summary.json'), 'w', encoding='utf-8') as out:
+        json.dump({'vfs': vfs_path, 'jobs': jobs, 'seconds': elapsed, 'results': results}, out,
+                  ensure_ascii=False, indent=2)
+    return STATUS_OK if not failed else STATUS_ERRORS
@@ -0,0 +1,586 @@
+import getpass
+import json
+import os
+import re
+import socket
+import sys
+import time
+
+import shell_stats
+import vfs_search
+import vfs_convert
+from vfs import VFS, VFSFormatError, VFSOperationError, normalize_path
+
+DEFAULT_CACHE_MB = VFS.DEFAULT_CACHE_BYTES // (1024 * 1024)  # размер кэша содержимого по умолчанию
+
+HELP_TEXT = (
+    "Доступные команды:\n"
+    "  ls [path]     - список файлов и папок\n"
+    "  cd [path]     - сменить текущую папку\n"
+    "  cat <file>    - показать содержимое файла\n"
+    "  pwd           - показать текущий путь\n"
+    "  find [path] [-name glob] [-type f|d] - поиск по имени\n"
+    "  grep <pattern> [path] - поиск по содержимому файлов\n"
+    "  du [path]     - размер и число записей поддерева\n"
+    "  tree [path] [-L depth] - дерево папок\n"
+    "  index [off]   - построить или удалить индекс для grep\n"
+    "  mkdir <path>  - создать папку\n"
+    "  touch <path>  - создать пустой файл\n"
+    "  write <file> <text> - записать текст в файл\n"
+    "  rm [-r] <path> - удалить файл или папку\n"
+    "  compact       - свернуть журнал изменений в новый образ\n"
+    "  cache         - статистика кэша содержимого\n"
+    "  stats [on|off|reset] - задержки команд по фазам\n"
+    "  exit          - выход из эмулятора\n"
+    "  help          - эта справка\n"
+)
+
+
+class ShellEngine:
+    """Логика командной оболочки без привязки к интерфейсу: вывод идет через write"""
+
+    def __init__(self, write, vfs=None, stats=None):
+        self.write = write  # функция вывода текста, ее предоставляет интерфейс
+        self.stats = stats or shell_stats.STATS  # гистограммы задержек по фазам команд
+        self.vfs_index = vfs  # индекс путей VFS, строится один раз при загрузке
+        self.current_path = "/"  # текущий путь в VFS
+        self.exit_requested = False  # выставляется командой exit, завершение делает интерфейс
+        self.errors = 0  # сколько сообщений об ошибках выведено, по нему пакетный режим выставляет статус
+        self.watch_interval = None  # как часто перед командой проверять файл образа, в секундах
+        self.next_watch = 0.0
+        self.prompt_prefix = f"{getpass.getuser()}@{socket.gethostname()}"  # имя пользователя и hostname
+        self.commands = {  # таблица команд: имя -> обработчик
+            'ls': self.cmd_ls,
+            'cd': self.cmd_cd,
+            'cat': self.cmd_cat,
+            'pwd': self.cmd_pwd,
+            'find': self.cmd_find,
+            'grep': self.cmd_grep,
+            'du': self.cmd_du,
+            'tree': self.cmd_tree,
+            'index': self.cmd_index,
+            'mkdir': self.cmd_mkdir,
+            'touch': self.cmd_touch,
+            'write': self.cmd_write,
+            'rm': self.cmd_rm,
+            'compact': self.cmd_compact,
+            'cache': self.cmd_cache,
+            'stats': self.cmd_stats,
+            'help': self.cmd_help,
+            'exit': self.cmd_exit,
+        }
+
+    def load_vfs(self, vfs_path, cache_bytes=VFS.DEFAULT_CACHE_BYTES, progress=None, checksums=False):
+        # загрузка VFS из JSON или бинарного образа: содержимое файлов читается с диска по запросу
+        if not os.path.exists(vfs_path):  # проверяем существование файла VFS
+            self.error(f"Ошибка: VFS файл '{vfs_path}' не найден\n")
+            return
+        phases = {} if self.stats.enabled else None  # время фаз загрузки нужно только при включенных замерах
+        try:
+            vfs = VFS.load(vfs_path, progress=progress, phases=phases, cache_bytes=cache_bytes,
+                           checksums=checksums)  # формат определяется по сигнатуре файла
+        except Exception as e:
+            self.report_load_error(e)
+            return
+        self.attach_vfs(vfs, vfs_path, phases)
+
+    def attach_vfs(self, vfs, vfs_path, phases=None):
+        """Подключение уже загруженной VFS (например, из фонового потока)"""
+        self.vfs_index = vfs
+        for phase, ns in (phases or {}).items():  # фазы загрузки, замеренные загрузчиком
+            self.stats.record(f"load.{phase}", ns)
+        self.write(f"VFS успешно загружена из '{vfs_path}'\n")
+
+        # Проверяем наличие motd и выводим его
+        started = self.stats.clock()
+        self.display_motd()
+        self.stats.record('load.motd', self.stats.clock() - started)
+
+    def error(self, message):
+        """Вывод сообщения об ошибке с подсчетом"""
+        self.errors += 1
+        self.write(message)
+
+    def report_load_error(self, error):
+        """Сообщение об ошибке загрузки VFS"""
+        if isinstance(error, json.JSONDecodeError):  # обработка ошибок формата JSON
+            self.error(f"Ошибка загрузки VFS: неверный формат JSON - {str(error)}\n")
+        elif isinstance(error, VFSFormatError):  # обработка ошибок формата образа
+            self.error(f"Ошибка загрузки VFS: неверный формат образа - {str(error)}\n")
+        else:  # обработка других ошибок
+            self.error(f"Ошибка загрузки VFS: {str(error)}\n")
+
+    def poll_image(self):
+        """Проверка файла образа; если он изменился, разница читается и применяется сразу"""
+        if not self.vfs_index or not self.vfs_index.image_changed():  # обычно это один stat
+            return
+        try:
+            diff = self.vfs_index.diff_image()
+        except Exception as e:
+            self.report_reload_error(e)
+            return
+        if diff is not None:
+            self.apply_image_diff(diff)
+
+    def apply_image_diff(self, diff):
+        """Применение разницы с новой версией образа (после diff_image, возможно из фонового потока)"""
+        started = time.perf_counter()
+        counts = self.vfs_index.apply_diff(diff)
+        self.stats.record('reload.scan', int(diff.seconds * 1e9))
+        self.stats.record('reload.apply', int((time.perf_counter() - started) * 1e9))
+        self.leave_missing_path()
+        self.write(f"VFS обновлена с диска: добавлено {counts['added']}, изменено {counts['changed']}, "
+                   f"удалено {counts['removed']} (чтение {diff.seconds:.2f} с, "
+                   f"применение {(time.perf_counter() - started) * 1000:.1f} мс)\n")
+
+    def report_reload_error(self, error):
+        """Сообщение об ошибке перезагрузки: остается прежняя версия VFS"""
+        self.error(f"Ошибка перезагрузки VFS, используется прежняя версия: {str(error)}\n")
+
+    def leave_missing_path(self):
+        """Подъем из текущей папки, если ее больше нет в VFS"""
+        while not self.path_exists(self.current_path):
+            self.current_path = self.current_path.rsplit('/', 1)[0] or '/'
+
+    def display_motd(self):
+        # вывод сообщения motd если оно существует в VFS
+        if self.vfs_index and self.vfs_index.motd:  # первый motd запоминается при загрузке
+            try:
+                content = self.vfs_index.read_text(self.vfs_index.motd)  # раскодированное содержимое через кэш
+            except Exception as e:
+                self.error(f"Ошибка декодирования motd: {str(e)}\n")
+                return
+
+            self.write(f"\n=== MOTD ===\n{content}\n============\n\n")  # выводим motd
+
+    def find_in_vfs(self, path):
+        """Поиск файла или папки в VFS по пути"""
+        if not self.vfs_index:  # проверяем загружена ли VFS
+            return None
+
+        return self.vfs_index.lookup(self.resolve_path(path))  # точное совпадение через индекс
+
+    def list_directory(self, path):
+        """Получение списка файлов и папок в указанном пути"""
+        if not self.vfs_index:  # проверяем загружена ли VFS
+            return []
+
+        return self.vfs_index.list(self.resolve_path(path))  # дети узла из индекса, None если пути нет
+
+    def resolve_path(self, target_path):
+        """Разрешение пути относительно текущего местоположения"""
+        if target_path.startswith('/'):  # если путь абсолютный
+            return normalize_path(target_path)  # просто нормализуем
+        else:  # если путь относительный
+            if self.current_path == '/':  # если текущий путь - корень
+                new_path = '/' + target_path
+            else:
+                new_path = self.current_path + '/' + target_path
+            return normalize_path(new_path)  # нормализуем и возвращаем
+
+    def path_exists(self, path):
+        """Проверка существования пути в VFS"""
+        if not self.vfs_index:  # проверяем загружена ли VFS
+            return False
+
+        return self.vfs_index.exists(path)  # корень и неявные папки тоже есть в индексе
+
+    def prompt(self):
+        """Строка приглашения с текущим путем"""
+        return f"{self.prompt_prefix}:{self.current_path}$ "
+
+    def execute(self, command_input, echo=True):
+        """Выполнение одной команды; echo - вывести приглашение с командой"""
+        command_input = command_input.strip()  # обрезаем лишние пробелы
+        if not command_input:  # пустая строка - ничего не делаем
+            return
+
+        if self.watch_interval is not None and time.monotonic() >= self.next_watch:  # без таймера: проверка перед командой
+            self.next_watch = time.monotonic() + self.watch_interval
+            self.poll_image()
+
+        if echo:
+            self.write(f"{self.prompt()}{command_input}\n")  # выводим на экран введенную команду
+
+        clock, record = self.stats.clock, self.stats.record  # берем вместе: stats on/off не должен смешать часы
+        started = clock()
+        parts = command_input.split()  # парсим по пробелам
+        command = parts[0]  # первый элемент списка - имя команды
+        args = parts[1:]  # остальное - аргументы команды
+
+        handler = self.commands.get(command)
+        if handler is None:  # иначе выводим сообщение об ошибке
+            self.error(f"Ошибка: неизвестная команда '{command}'\n")
+            return
+        parsed = clock()
+        handler(args)
+        record(f"{command}.parse", parsed - started)
+        record(f"{command}.total", clock() - started)
+
+    def execute_script_line(self, line):
+        """Выполнение строки скрипта; True если строка была командой"""
+        line = line.strip()  # получаем строку без пробелов по краям
+        if not line:  # пустые строки пропускаем
+            return False
+        if line.startswith('#'):  # если строка начинается с символа комментария
+            self.write(f"# {line[1:]}\n")
+            return False
+        self.execute(line)
+        return True
+
+    def cmd_ls(self, args):
+        clock = self.stats.clock
+        target_path = args[0] if args else self.current_path  # определяем целевой путь
+        started = clock()
+        items = self.list_directory(target_path)  # получаем список элементов
+        found = clock()
+        self.stats.record('ls.lookup', found - started)
+
+        if items is None:  # проверяем на ошибку
+            self.error(f"Ошибка: путь '{target_path}' не найден в VFS\n")
+        elif not items:  # если папка пустая
+            self.write("Папка пуста\n")
+        else:
+            # одна строка вывода на всю папку вместо вызова write на каждый элемент
+            self.write(''.join(f"{'d' if item.kind == 'directory' else '-'} {item.name}\n" for item in items))
+        self.stats.record('ls.render', clock() - found)
+
+    def cmd_cd(self, args):
+        if not args:  # если аргументов нет
+            self.current_path = "/"  # переходим в корень
+            self.write("Переход в корневую папку\n")
+            return
+
+        target_path = args[0]  # берем первый аргумент как целевой путь
+        started = self.stats.clock()
+        new_path = self.resolve_path(target_path)  # вычисляем новый путь
+        exists = self.path_exists(new_path)  # проверяем существование пути в VFS
+        self.stats.record('cd.lookup', self.stats.clock() - started)
+
+        if exists:
+            self.current_path = new_path  # обновляем текущий путь
+            self.write(f"Текущий путь: {self.current_path}\n")
+        else:
+            self.error(f"Ошибка: путь '{target_path}' не найден в VFS\n")
+
+    def cmd_cat(self, args):
+        if not args:  # проверяем наличие аргументов
+            self.error("Ошибка: укажите имя файла\n")
+            return
+
+        clock = self.stats.clock
+        filename = args[0]  # берем имя файла
+        started = clock()
+        file_entry = self.find_in_vfs(filename)  # ищем файл в VFS
+        found = clock()
+        self.stats.record('cat.lookup', found - started)
+
+        if file_entry and file_entry.type == 'file':  # проверяем что это файл
+            try:
+                content = self.vfs_index.read_text(file_entry)  # раскодированное содержимое через кэш
+            except Exception as e:
+                self.error(f"Ошибка декодирования файла: {str(e)}\n")
+                return
+            decoded = clock()
+            self.stats.record('cat.decode', decoded - found)
+
+            self.write(f"Содержимое файла '{filename}':\n{content}\n")  # выводим содержимое
+            self.stats.record('cat.render', clock() - decoded)
+        else:
+            self.error(f"Ошибка: файл '{filename}' не найден\n")
+
+    def cmd_pwd(self, args):
+        self.write(f"Текущий путь: {self.current_path}\n")  # выводим текущий путь
+
+    def parse_options(self, args, options):
+        """Разбор аргументов вида [path] [-opt value]...; None при ошибке (сообщение уже выведено)"""
+        target_path = self.current_path
+        values = {}
+        i = 0
+        while i < len(args):
+            if args[i] in options:
+                if i + 1 >= len(args):
+                    self.error(f"Ошибка: для {args[i]} не указано значение\n")
+                    return None
+                values[options[args[i]]] = args[i + 1]
+                i += 2
+            elif args[i].startswith('-'):
+                self.error(f"Ошибка: неизвестный параметр '{args[i]}'\n")
+                return None
+            else:
+                target_path = args[i]
+                i += 1
+        return target_path, values
+
+    def cmd_find(self, args):
+        parsed = self.parse_options(args, {'-name': 'name', '-type': 'type'})
+        if parsed is None:
+            return
+        target_path, options = parsed
+        node_type = {'f': 'file', 'd': 'directory', None: None}.get(options.get('type'), False)
+        if node_type is False:
+            self.error("Ошибка: -type принимает f или d\n")
+            return
+        path = self.resolve_path(target_path)
+        if not self.path_exists(path):
+            self.error(f"Ошибка: путь '{target_path}' не найден в VFS\n")
+            return
+        results = vfs_search.find(self.vfs_index, path, options.get('name'), node_type)
+        self.write(''.join(f"{result}\n" for result in results))
+
+    def cmd_grep(self, args):
+        if not args:
+            self.error("Ошибка: укажите шаблон поиска\n")
+            return
+        target_path = args[1] if len(args) > 1 else self.current_path
+        path = self.resolve_path(target_path)
+        if not self.path_exists(path):
+            self.error(f"Ошибка: путь '{target_path}' не найден в VFS\n")
+            return
+        try:
+            results = vfs_search.grep(self.vfs_index, args[0], path, self.vfs_index.text_index)
+        except re.error as e:
+            self.error(f"Ошибка: неверный шаблон - {str(e)}\n")
+            return
+        self.write(''.join(f"{found}:{number}:{line}\n" for found, number, line in results))
+
+    def cmd_du(self, args):
+        target_path = args[0] if args else self.current_path
+        path = self.resolve_path(target_path)
+        if not self.path_exists(path):
+            self.error(f"Ошибка: путь '{target_path}' не найден в VFS\n")
+            return
+        # итоги поддеревьев посчитаны при загрузке, поэтому вывод стоит O(число детей)
+        node = self.vfs_index.node(path)
+        prefix = '' if path == '/' else path
+        lines = [f"{'байт':>12} {'записей':>8}  путь\n"]
+        for child in self.vfs_index.sorted_children(node):
+            if child.kind == 'directory':
+                lines.append(f"{child.size:>12} {child.count:>8}  {prefix}/{child.name}\n")
+        lines.append(f"{node.size:>12} {node.count:>8}  {path}\n")
+        self.write(''.join(lines))
+
+    def cmd_tree(self, args):
+        parsed = self.parse_options(args, {'-L': 'depth'})
+        if parsed is None:
+            return
+        target_path, options = parsed
+        try:
+            max_depth = int(options['depth']) if 'depth' in options else None
+        except ValueError:
+            self.error("Ошибка: -L принимает число\n")
+            return
+        path = self.resolve_path(target_path)
+        if not self.path_exists(path):
+            self.error(f"Ошибка: путь '{target_path}' не найден в VFS\n")
+            return
+
+        lines = [f"{path}\n"]
+        dirs = files = 0
+        # стек кадров [дети, следующий номер, отступ, глубина]: без рекурсии на глубоких образах
+        stack = [[self.vfs_index.sorted_children(self.vfs_index.node(path)), 0, '', 1]]
+        while stack:
+            frame = stack[-1]
+            children, i, indent, depth = frame
+            if i >= len(children):
+                stack.pop()
+                continue
+            frame[1] = i + 1
+            child = children[i]
+            last = i == len(children) - 1
+            lines.append(f"{indent}{'└── ' if last else '├── '}{child.name}\n")
+            if child.kind == 'directory':
+                dirs += 1
+                if max_depth is None or depth < max_depth:  # поддерево выводится сразу под своей строкой
+                    stack.append([self.vfs_index.sorted_children(child), 0, indent + ('    ' if last else '│   '), depth + 1])
+            else:
+                files += 1
+        lines.append(f"\nпапок: {dirs}, файлов: {files}\n")
+        self.write(''.join(lines))
+
+    def cmd_index(self, args):
+        """Построение индекса n-грамм для grep; index off удаляет его"""
+        if not self.vfs_index:  # проверяем загружена ли VFS
+            self.error("Ошибка: VFS не загружена\n")
+            return
+        if self.vfs_index.read_only:  # индекс общий: его нельзя убрать или перестраивать из одной сессии
+            self.error("Ошибка: VFS открыта только для чтения, индекс строится при запуске (--index)\n")
+            return
+        if args and args[0] == 'off':
+            self.vfs_index.text_index = None
+            self.write("Индекс удален\n")
+            return
+        started = time.perf_counter()
+        index = vfs_search.TrigramIndex.build(self.vfs_index)
+        self.vfs_index.text_index = index  # индекс общий для всех сессий этой VFS
+        stats = index.stats()
+        self.write(f"Индекс построен за {time.perf_counter() - started:.2f} с: файлов {stats['files']}, "
+                   f"n-грамм {stats['grams']}, вхождений {stats['postings']}\n")
+
+    def modify(self, operation, *args):
+        """Вызов изменяющего метода VFS по имени; False если он не удался (сообщение уже выведено)"""
+        if not self.vfs_index:  # проверяем загружена ли VFS
+            self.error("Ошибка: VFS не загружена\n")
+            return False
+        try:
+            getattr(self.vfs_index, operation)(*args)
+        except VFSOperationError as e:
+            self.error(f"Ошибка: {str(e)}\n")
+            return False
+        except OSError as e:  # журнал не удалось записать
+            self.error(f"Ошибка записи журнала: {str(e)}\n")
+            return False
+        return True
+
+    def cmd_mkdir(self, args):
+        if not args:
+            self.error("Ошибка: укажите путь\n")
+            return
+        if self.modify('mkdir', self.resolve_path(args[0])):
+            self.write(f"Папка '{args[0]}' создана\n")
+
+    def cmd_touch(self, args):
+        if not args:
+            self.error("Ошибка: укажите путь\n")
+            return
+        self.modify('touch', self.resolve_path(args[0]))
+
+    def cmd_write(self, args):
+        if not args:
+            self.error("Ошибка: укажите имя файла\n")
+            return
+        text = ' '.join(args[1:])  # команда уже разбита по пробелам, слова соединяем одним пробелом
+        if self.modify('write_file', self.resolve_path(args[0]), text):
+            self.write(f"Записано в '{args[0]}': {len(text)} символов\n")
+
+    def cmd_rm(self, args):
+        recursive = bool(args) and args[0] == '-r'
+        if recursive:
+            args = args[1:]
+        if not args:
+            self.error("Ошибка: укажите путь\n")
+            return
+        path = self.resolve_path(args[0])
+        if self.modify('remove', path, recursive):
+            self.leave_missing_path()  # текущая папка удалена - поднимаемся к существующей
+            self.write(f"Удалено: {path}\n")
+
+    def cmd_compact(self, args):
+        """Свертка журнала изменений в новый базовый образ"""
+        if not self.vfs_index or self.vfs_index.image_path is None:
+            self.error("Ошибка: VFS не загружена из образа\n")
+            return
+        started = time.perf_counter()
+        try:
+            vfs_convert.compact(self.vfs_index)
+        except (OSError, ValueError) as e:
+            self.error(f"Ошибка свертки журнала: {str(e)}\n")
+            return
+        self.write(f"Журнал свернут в '{self.vfs_index.image_path}' за {time.perf_counter() - started:.2f} с\n")
+
+    def cmd_cache(self, args):
+        """Вывод счетчиков кэша содержимого"""
+        if not self.vfs_index:  # проверяем загружена ли VFS
+            self.write("VFS не загружена\n")
+            return
+        stats = self.vfs_index.content_cache.stats()
+        self.write(f"Кэш: попаданий {stats['hits']}, промахов {stats['misses']}, вытеснений {stats['evictions']}\n")
+        self.write(f"Занято: {stats['bytes']} из {stats['max_bytes']} байт ({stats['entries']} файлов)\n")
+
+    def cmd_stats(self, args):
+        """Таблица задержек по фазам; stats on|off|reset управляет замерами"""
+        if args:
+            if args[0] == 'on':
+                self.stats.enable()
+                self.write("Замеры включены\n")
+            elif args[0] == 'off':
+                self.stats.disable()
+                self.write("Замеры выключены\n")
+            elif args[0] == 'reset':
+                self.stats.reset()
+                self.write("Замеры сброшены\n")
+            else:
+                self.error(f"Ошибка: неизвестный аргумент '{args[0]}', ожидается on, off или reset\n")
+            return
+        if not self.stats.histograms:
+            state = "включены" if self.stats.enabled else "выключены (stats on или --stats)"
+            self.write(f"Замеров пока нет, замеры {state}\n")
+            return
+        self.write(self.stats.format_table())
+
+    def cmd_help(self, args):
+        self.write(HELP_TEXT)
+
+    def cmd_exit(self, args):
+        self.exit_requested = True  # интерфейс сам решает, как завершиться
+
+
+class ScriptRunner:
+    """Выполнение скрипта порциями: интерфейс вызывает run_slice на каждом такте своего цикла"""
+
+    def __init__(self, engine, lines):
+        self.engine = engine
+        self.lines = lines
+        self.index = 0  # номер следующей строки
+
+    @property
+    def done(self):
+        return self.index >= len(self.lines) or self.engine.exit_requested
+
+    def run_slice(self, time_budget=None, max_commands=None):
+        """Выполнение строк, пока не истечет time_budget секунд или не наберется max_commands команд"""
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        executed = 0
+        clock = self.engine.stats.clock
+        record = self.engine.stats.record
+        while not self.done:
+            line = self.lines[self.index]
+            self.index += 1
+            started = clock()
+            if self.engine.execute_script_line(line):
+                record('script.line', clock() - started)
+                executed += 1
+                if max_commands is not None and executed >= max_commands:
+                    break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        return executed
+
+
+def run_headless(vfs_path=None, script_path=None, cache_mb=DEFAULT_CACHE_MB, stdin=None, stdout=None, watch=None):
+    """Пакетный режим без Tk: команды из скрипта или stdin, вывод в stdout.
+
+    watch - проверять файл образа перед командами не чаще чем раз в watch секунд.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+
+    engine = ShellEngine(stdout.write)
+    engine.watch_interval = watch
+    if vfs_path:  # если указан путь к VFS, загружаем ее
+        engine.load_vfs(vfs_path, cache_bytes=int(cache_mb * 1024 * 1024), checksums=watch is not None)
+
+    if script_path:
+        if not os.path.exists(script_path):  # проверяем существование файла
+            stdout.write(f"Ошибка: скрипт '{script_path}' не найден\n")
+            return 1
+        with open(script_path, 'r', encoding='utf-8') as file:
+            lines = file.readlines()
+        ScriptRunner(engine, lines).run_slice()  # строки выполняются подряд, без задержек
+        if engine.exit_requested:
+            stdout.write("Завершение работы по скрипту...\n")
+        return 0
+
+    interactive = stdin.isatty()
+    while not engine.exit_requested:
+        if interactive:  # в терминале показываем приглашение
+            stdout.write(engine.prompt())
+            stdout.flush()
+        line = stdin.readline()
+        if not line:  # конец ввода
+            break
+        if interactive:  # команду пользователь уже видит в терминале
+            engine.execute(line, echo=False)
+        else:
+            engine.execute_script_line(line)
+    return 0
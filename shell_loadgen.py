@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from vfs_bench import percentiles
+
+PROMPT_END = b'$ '  # каждый ответ сервера заканчивается приглашением
+READ_LIMIT = 1 << 24  # вывод ls большой папки длиннее стандартного предела StreamReader
+CONNECT_BATCH = 256  # сколько подключений открывать одновременно
+DEFAULT_COMMANDS = 'ls;pwd;cat /motd;cd /;ls /'
+
+
+def process_rss_kb(pid):
+    """Резидентная память процесса по /proc, None если недоступно"""
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def process_cpu_seconds(pid):
+    """Пользовательское и системное время процесса по /proc, None если недоступно"""
+    try:
+        with open(f'/proc/{pid}/stat', encoding='ascii') as stat:
+            fields = stat.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')  # utime и stime
+
+
+async def open_session(address):
+    """Подключение и чтение приветствия до первого приглашения"""
+    if '/' in address:
+        reader, writer = await asyncio.open_unix_connection(address, limit=READ_LIMIT)
+    else:
+        host, port = address.rsplit(':', 1)
+        reader, writer = await asyncio.open_connection(host, int(port), limit=READ_LIMIT)
+    await reader.readuntil(PROMPT_END)
+    return reader, writer
+
+
+async def run_session(reader, writer, commands, deadline, think, timings):
+    """Команды по кругу до deadline; задержка - от отправки до следующего приглашения"""
+    index = 0
+    while time.perf_counter() < deadline:
+        command = commands[index % len(commands)]
+        index += 1
+        started = time.perf_counter_ns()
+        writer.write(command.encode('utf-8') + b'\n')
+        await reader.readuntil(PROMPT_END)
+        timings.append(time.perf_counter_ns() - started)
+        if think:
+            await asyncio.sleep(think)
+    writer.write(b'exit\n')
+    writer.close()
+
+
+async def run_load(address, sessions, duration, commands, think, server_pid=None):
+    """Открывает sessions сессий, затем гоняет команды duration секунд"""
+    rss_before = process_rss_kb(server_pid) if server_pid else None
+    connections = []
+    for first in range(0, sessions, CONNECT_BATCH):  # порциями, чтобы не переполнить очередь подключений
+        batch = min(CONNECT_BATCH, sessions - first)
+        connections += await asyncio.gather(*(open_session(address) for _ in range(batch)))
+    rss_after = process_rss_kb(server_pid) if server_pid else None
+
+    timings = []
+    cpu_before = process_cpu_seconds(server_pid) if server_pid else None
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(run_session(reader, writer, commands, deadline, think, timings)
+                           for reader, writer in connections))
+    elapsed = time.perf_counter() - started
+    cpu_after = process_cpu_seconds(server_pid) if server_pid else None
+
+    result = {'sessions': sessions, 'commands': len(timings), 'elapsed_s': elapsed,
+              'commands_per_s': len(timings) / elapsed}
+    result.update(percentiles(timings or [0]))
+    if rss_before is not None and rss_after is not None:
+        result['server_rss_kb'] = rss_after
+        result['kb_per_session'] = (rss_after - rss_before) / sessions
+    if cpu_before is not None and cpu_after is not None:
+        cpu_load = (cpu_after - cpu_before) / elapsed  # доля одного ядра, занятая сервером
+        result['server_cpu_load'] = cpu_load
+        if cpu_load:
+            result['commands_per_core_s'] = len(timings) / (cpu_after - cpu_before)
+            result['sessions_per_core'] = sessions / cpu_load  # при той же паузе между командами
+    return result
+
+
+def spawn_server(vfs_path, workdir):
+    """Запуск сервера отдельным процессом на Unix сокете; ждем, пока сокет появится"""
+    address = os.path.join(workdir, 'shell.sock')
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    command = [sys.executable, main_py, '--serve', '--listen', address]
+    if vfs_path:
+        command += ['--vfs', vfs_path]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    while not os.path.exists(address):  # VFS большого образа грузится несколько секунд
+        if server.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {server.returncode}")
+        time.sleep(0.05)
+    return server, address
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор нагрузки для серверного режима эмулятора')
+    parser.add_argument('--connect', type=str, help='Адрес сервера host:port или путь к Unix сокету')
+    parser.add_argument('--spawn', type=str, metavar='VFS',
+                        help='Запустить сервер самому с этим образом (память и CPU сервера видны через /proc)')
+    parser.add_argument('--server-pid', type=int, help='PID уже запущенного сервера для замера памяти и CPU')
+    parser.add_argument('--sessions', type=str, default='1,10,100,1000',
+                        help='Числа одновременных сессий через запятую')
+    parser.add_argument('--duration', type=float, default=5.0, help='Длительность каждого прогона в секундах')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='Пауза сессии между командами в мс')
+    parser.add_argument('--commands', type=str, default=DEFAULT_COMMANDS, help='Команды через ;')
+    parser.add_argument('--json', type=str, help='Сохранить результаты в JSON')
+    args = parser.parse_args()
+    if not args.connect and not args.spawn:
+        parser.error('нужен --connect или --spawn')
+
+    commands = [command.strip() for command in args.commands.split(';') if command.strip()]
+    report = []
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        address, server_pid = args.connect, args.server_pid
+        if args.spawn:
+            server, address = spawn_server(args.spawn, workdir)
+            server_pid = server.pid
+        try:
+            print(f"{'сессий':>8}{'команд/с':>12}{'p50 мкс':>12}{'p99 мкс':>12}{'CPU ядра':>10}"
+                  f"{'сессий/ядро':>13}{'КБ/сессию':>11}")
+            for sessions in [int(value) for value in args.sessions.split(',')]:
+                result = asyncio.run(run_load(address, sessions, args.duration, commands,
+                                              args.think_ms / 1000, server_pid))
+                report.append(result)
+                print(f"{sessions:>8}{result['commands_per_s']:>12.0f}{result['p50_us']:>12.1f}{result['p99_us']:>12.1f}"
+                      f"{result.get('server_cpu_load', 0):>10.2f}{result.get('sessions_per_core', 0):>13.0f}"
+                      f"{result.get('kb_per_session', 0):>11.1f}")
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as out:
+            json.dump({'commands': commands, 'think_ms': args.think_ms, 'results': report}, out,
+                      ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
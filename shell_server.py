@@ -0,0 +1,122 @@
+import asyncio
+import errno
+import os
+import stat
+import sys
+
+from shell_engine import ShellEngine, DEFAULT_CACHE_MB
+
+DEFAULT_LISTEN = '127.0.0.1:8023'  # адрес по умолчанию; путь с '/' - Unix сокет
+LINE_LIMIT = 64 * 1024  # предел длины строки команды
+BACKLOG = 1024  # очередь подключений: при массовом подключении сессий стандартных 100 мало
+
+
+class ShellServer:
+    """Сервер сессий: VFS загружена один раз, у каждого подключения свой ShellEngine"""
+
+    def __init__(self, vfs=None):
+        self.vfs = vfs  # общая VFS только для чтения, ее разделяют все сессии
+        self.sessions = 0  # число открытых сессий
+        self.total_sessions = 0  # сессий с момента запуска
+        self.engines = set()  # движки открытых сессий: после перезагрузки VFS их текущие папки проверяются
+
+    async def handle_session(self, reader, writer):
+        # одна сессия: своя текущая папка, вывод копится в списке и уходит клиенту после каждой команды
+        output = []
+        engine = ShellEngine(output.append, vfs=self.vfs)
+        self.engines.add(engine)
+        self.sessions += 1
+        self.total_sessions += 1
+        try:
+            output.append("Добро пожаловать в эмулятор командной оболочки OC.\nВведите exit для выхода, help - список команд.\n")
+            engine.display_motd()
+            while not engine.exit_requested:
+                output.append(engine.prompt())
+                writer.write(''.join(output).encode('utf-8'))
+                output.clear()
+                await writer.drain()  # медленный клиент не копит вывод в памяти сервера
+
+                try:
+                    line = await reader.readline()
+                except ValueError:  # строка длиннее LINE_LIMIT
+                    writer.write("Ошибка: слишком длинная строка\n".encode('utf-8'))
+                    break
+                if not line:  # клиент закрыл соединение
+                    break
+                engine.execute(line.decode('utf-8', errors='replace'), echo=False)  # команду клиент уже видит у себя
+            if engine.exit_requested:
+                writer.write(''.join(output).encode('utf-8') + "Сессия завершена\n".encode('utf-8'))
+                await writer.drain()
+        except ConnectionError:  # клиент пропал посреди вывода
+            pass
+        finally:
+            self.engines.discard(engine)
+            self.sessions -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def watch_image(self, interval):
+        """Проверка файла образа раз в interval секунд; разбор новой версии идет в потоке пула"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            if self.vfs is None or not self.vfs.image_changed():
+                continue
+            try:
+                diff = await loop.run_in_executor(None, self.vfs.diff_image)
+            except Exception as e:
+                print(f"Ошибка перезагрузки VFS, используется прежняя версия: {str(e)}", flush=True)
+                continue
+            if diff is None:
+                continue
+            counts = self.vfs.apply_diff(diff)  # в цикле событий, между командами сессий
+            for engine in self.engines:
+                engine.leave_missing_path()
+            print(f"VFS обновлена с диска: добавлено {counts['added']}, изменено {counts['changed']}, "
+                  f"удалено {counts['removed']}", flush=True)
+
+    async def serve(self, listen=DEFAULT_LISTEN, watch=None):
+        """Прием подключений на TCP адресе host:port или Unix сокете"""
+        if '/' in listen:
+            if os.path.exists(listen):
+                if not stat.S_ISSOCK(os.stat(listen).st_mode):  # опечатка в --listen не должна удалять файлы
+                    raise FileExistsError(errno.EEXIST, "путь занят и не является сокетом", listen)
+                os.remove(listen)  # сокет от прошлого запуска
+            server = await asyncio.start_unix_server(self.handle_session, path=listen, limit=LINE_LIMIT,
+                                                     backlog=BACKLOG)
+        else:
+            host, port = listen.rsplit(':', 1)
+            server = await asyncio.start_server(self.handle_session, host or None, int(port), limit=LINE_LIMIT,
+                                                backlog=BACKLOG)
+        addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Сервер слушает {addresses}", flush=True)
+        if watch:
+            self.watcher = asyncio.create_task(self.watch_image(watch))  # ссылка держит задачу от сборщика мусора
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(vfs_path=None, listen=DEFAULT_LISTEN, cache_mb=DEFAULT_CACHE_MB, watch=None, index=False):
+    """Серверный режим: одна загрузка VFS на все сессии"""
+    loader = ShellEngine(sys.stdout.write)  # сообщения о загрузке идут в консоль сервера
+    if vfs_path:
+        loader.load_vfs(vfs_path, cache_bytes=int(cache_mb * 1024 * 1024), checksums=watch is not None)
+        if loader.vfs_index is None:  # ошибка загрузки уже выведена
+            return 1
+        if index:  # до открытия сокета: построение остановило бы цикл событий для всех сессий
+            loader.cmd_index([])
+        # сессии не должны видеть изменения друг друга и оставаться в удаленных другими папках
+        loader.vfs_index.read_only = True
+    sys.stdout.flush()
+
+    try:
+        asyncio.run(ShellServer(loader.vfs_index).serve(listen, watch))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:  # адрес занят или путь сокета занят обычным файлом
+        print(f"Ошибка запуска сервера: {str(e)}", file=sys.stderr)
+        return 1
+    return 0
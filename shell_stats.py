@@ -0,0 +1,93 @@
+import json
+import time
+
+
+def _no_clock():
+    return 0
+
+
+class Histogram:
+    """Гистограмма задержек с логарифмическими корзинами: корзина b хранит значения меньше 2**b нс"""
+
+    BUCKETS = 48  # до 2**47 нс - больше полутора суток
+
+    def __init__(self):
+        self.buckets = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        self.buckets[min(ns.bit_length(), self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q):
+        """Оценка перцентиля сверху - граница корзины, в нс"""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for bucket, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(1 << bucket, self.max)
+        return self.max
+
+    def summary(self):
+        return {'count': self.count, 'mean_us': self.total / self.count / 1000 if self.count else 0.0,
+                'p50_us': self.percentile(0.5) / 1000, 'p90_us': self.percentile(0.9) / 1000,
+                'p99_us': self.percentile(0.99) / 1000, 'max_us': self.max / 1000}
+
+
+class Stats:
+    """Набор гистограмм по фазам; в выключенном состоянии clock и record ничего не делают"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.disable()
+
+    def enable(self):
+        self.enabled = True
+        self.clock = time.perf_counter_ns
+        self.record = self._record
+
+    def disable(self):
+        self.enabled = False
+        self.clock = _no_clock  # замер стоит одного пустого вызова
+        self.record = self._skip
+
+    def reset(self):
+        self.histograms = {}
+
+    def _record(self, name, ns):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(ns)
+
+    def _skip(self, name, ns):
+        pass
+
+    def summary(self):
+        return {name: self.histograms[name].summary() for name in sorted(self.histograms)}
+
+    def format_table(self):
+        """Текстовая таблица для команды stats"""
+        lines = [f"{'фаза':<24}{'число':>9}{'сред мкс':>11}{'p50 мкс':>11}{'p90 мкс':>11}{'p99 мкс':>11}{'макс мкс':>11}\n"]
+        for name, row in self.summary().items():
+            lines.append(f"{name:<24}{row['count']:>9}{row['mean_us']:>11.1f}{row['p50_us']:>11.1f}"
+                         f"{row['p90_us']:>11.1f}{row['p99_us']:>11.1f}{row['max_us']:>11.1f}\n")
+        return ''.join(lines)
+
+    def dump_json(self, path, extra=None):
+        data = {'histograms': self.summary()}
+        if extra:
+            data.update(extra)
+        with open(path, 'w', encoding='utf-8') as out:
+            json.dump(data, out, ensure_ascii=False, indent=2)
+
+
+STATS = Stats()  # общий набор для процесса: все сессии и загрузка VFS пишут сюда
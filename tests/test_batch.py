@@ -0,0 +1,33 @@
+import io
+import os
+
+from shell_batch import STATUS_ERRORS, STATUS_FAILED, STATUS_OK, expand_scripts, run_batch
+
+IMAGE = os.path.join(os.path.dirname(__file__), '..', 'deep_vfs.json')
+
+
+def test_pattern_without_matches(tmp_path):
+    out = io.StringIO()
+    assert expand_scripts([str(tmp_path / 'nomatch*.sh')], stdout=out) == []
+    assert 'nomatch*.sh' in out.getvalue()
+    assert run_batch(None, [], str(tmp_path / 'out'), jobs=1, stdout=out) == STATUS_FAILED
+
+
+def test_scripts_run(tmp_path):
+    for name in ('a.sh', 'b.sh'):
+        (tmp_path / name).write_text('pwd\nls /\n', encoding='utf-8')
+    scripts = expand_scripts([str(tmp_path / '*.sh'), str(tmp_path / 'a.sh')])
+    assert [os.path.basename(path) for path in scripts] == ['a.sh', 'b.sh']
+    out = io.StringIO()
+    assert run_batch(IMAGE, scripts, str(tmp_path / 'out'), jobs=1, stdout=out) == STATUS_OK
+    assert 'Скриптов: 2' in out.getvalue()
+
+
+def test_index_built_once(tmp_path):
+    script = tmp_path / 'grep.sh'
+    script.write_text('grep VFS /\nindex\n', encoding='utf-8')
+    out = io.StringIO()
+    assert run_batch(IMAGE, [str(script)], str(tmp_path / 'out'), jobs=1, stdout=out, index=True) == STATUS_ERRORS
+    assert 'Индекс построен' in out.getvalue()
+    transcript = (tmp_path / 'out' / '0000_grep.sh.log').read_text(encoding='utf-8')
+    assert '/motd:1:' in transcript and 'индекс строится при запуске' in transcript
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from shell_engine import ShellEngine
+from vfs import VFS
+
+FILES = [
+    {'name': 'a', 'type': 'file', 'path': '/a', 'content': 'first line\nsecond line\nthird', 'encoding': 'plain'},
+    {'name': 'docs', 'type': 'directory', 'path': '/docs'},
+    {'name': 'readme.txt', 'type': 'file', 'path': '/docs/readme.txt', 'content': 'hello world\nline two\n',
+     'encoding': 'plain'},
+    {'name': 'deep.txt', 'type': 'file', 'path': '/docs/sub/deep.txt', 'content': 'deep line', 'encoding': 'plain'},
+    {'name': 'tool', 'type': 'file', 'path': '/bin/tool', 'content': 'AAEC', 'encoding': 'base64'},
+]
+
+
+@pytest.fixture(params=[False, True], ids=['scan', 'index'])
+def engine(request, tmp_path):
+    path = tmp_path / 'image.json'
+    path.write_text(json.dumps({'files': FILES}), encoding='utf-8')
+    image = VFS.load(str(path), journal=False)
+    output = []
+    engine = ShellEngine(output.append, vfs=image)
+    if request.param:
+        engine.execute('index', echo=False)
+    engine.output = output
+    yield engine
+    image.close()
+
+
+def run(engine, command):
+    engine.output.clear()
+    engine.execute(command, echo=False)
+    return ''.join(engine.output)
+
+
+def test_grep(engine):
+    assert run(engine, 'grep second /') == '/a:2:second line\n'
+    assert run(engine, 'grep line /docs') == '/docs/readme.txt:2:line two\n/docs/sub/deep.txt:1:deep line\n'
+    assert run(engine, 'grep nothing /') == ''
+
+
+def test_grep_anchors(engine):
+    assert run(engine, 'grep ^second /') == '/a:2:second line\n'
+    assert run(engine, 'grep line$ /') == '/a:1:first line\n/a:2:second line\n/docs/sub/deep.txt:1:deep line\n'
+    assert run(engine, 'grep ^third$ /a') == '/a:3:third\n'
+
+
+def test_grep_errors(engine):
+    assert 'неверный шаблон' in run(engine, 'grep ( /')
+    assert 'не найден' in run(engine, 'grep x /missing')
+
+
+def test_find(engine):
+    assert run(engine, 'find / -name *.txt') == '/docs/sub/deep.txt\n/docs/readme.txt\n'  # как в tree: сначала папки
+    assert run(engine, 'find /docs -type d') == '/docs\n/docs/sub\n'
+    assert 'принимает f или d' in run(engine, 'find / -type x')
+
+
+def test_tree(engine):
+    assert run(engine, 'tree /docs') == ('/docs\n'
+                                         '├── sub\n'
+                                         '│   └── deep.txt\n'
+                                         '└── readme.txt\n'
+                                         '\nпапок: 1, файлов: 2\n')
+    assert run(engine, 'tree / -L 1') == '/\n├── bin\n├── docs\n└── a\n\nпапок: 2, файлов: 1\n'
+    assert 'принимает число' in run(engine, 'tree / -L x')
+
+
+def test_index_read_only(engine):
+    index = engine.vfs_index.text_index
+    engine.vfs_index.read_only = True  # как в --serve и --batch: индекс общий для всех сессий
+    assert 'только для чтения' in run(engine, 'index off')
+    assert 'только для чтения' in run(engine, 'index')
+    assert engine.vfs_index.text_index is index
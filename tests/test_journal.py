@@ -0,0 +1,156 @@
+import json
+import os
+
+import pytest
+
+from vfs import VFS, ContentCache, VFSOperationError
+from vfs_convert import compact, json_to_pack
+from vfs_gen import generate_entries
+
+
+def snapshot(image):
+    """Пути, типы и содержимое файлов; содержимое читается заново из образа"""
+    image.content_cache = ContentCache(image.content_cache.max_bytes)
+    return {path: (node.kind, image.read_bytes(node) if node.is_file else None) for path, node in image.walk('/')}
+
+
+def change(image):
+    image.mkdir('/new')
+    image.touch('/new/empty')
+    image.write_file('/new/text', 'строка\n')
+    files = [node for node in image.iter_nodes() if node.is_file and not node.path().startswith('/new')]
+    image.write_file(files[0].path(), 'заменено')
+    image.remove(files[1].path())
+    image.remove(files[-1].parent.path(), recursive=True)
+
+
+def write_image(path, files):
+    """Запись образа целиком с подменой файла, как это делает внешний генератор"""
+    with open(path + '.json', 'w', encoding='utf-8') as f:
+        json.dump({'files': files}, f)
+    if path.endswith('.vfsp'):
+        json_to_pack(path + '.json', path + '.tmp')
+        os.remove(path + '.json')
+        os.replace(path + '.tmp', path)
+    else:
+        os.replace(path + '.json', path)
+
+
+@pytest.fixture(params=['image.json', 'image.vfsp'])
+def image_path(request, tmp_path):
+    path = str(tmp_path / request.param)
+    write_image(path, list(generate_entries(200, content_size=32, seed=2)))
+    return path
+
+
+def test_replay(image_path):
+    image = VFS.load(image_path)
+    change(image)
+    expected = snapshot(image)
+    image.close()
+    with open(image_path + '.journal', 'a', encoding='utf-8') as journal:
+        journal.write('{"op": "mkdir", "pa')  # недописанная строка после сбоя
+    image = VFS.load(image_path)
+    try:
+        assert snapshot(image) == expected
+    finally:
+        image.close()
+
+
+def test_compact(image_path):
+    image = VFS.load(image_path)
+    change(image)
+    expected = snapshot(image)
+    compact(image)
+    assert os.path.getsize(image_path + '.journal') == 0
+    assert snapshot(image) == expected
+    image.close()
+    image = VFS.load(image_path)
+    try:
+        assert snapshot(image) == expected
+    finally:
+        image.close()
+
+
+def test_failed_replace_keeps_image(image_path, monkeypatch):
+    image = VFS.load(image_path)
+    change(image)
+    expected = snapshot(image)
+    assert any(node.offset is not None for node in image.iter_nodes())  # часть содержимого лежит в образе
+
+    def deny(src, dst):
+        raise PermissionError(13, 'занято', dst)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'replace', deny)
+        with pytest.raises(PermissionError):
+            compact(image)
+    assert not os.path.exists(image_path + '.compact')
+    assert snapshot(image) == expected  # содержимое по-прежнему читается из старого образа
+    compact(image)
+    assert snapshot(image) == expected
+    image.close()
+
+
+def test_compact_read_only(image_path):
+    image = VFS.load(image_path)
+    image.read_only = True
+    try:
+        with pytest.raises(VFSOperationError):
+            compact(image)
+        assert not os.path.exists(image_path + '.compact')
+    finally:
+        image.close()
+
+
+def test_reload_with_journal(image_path):
+    image = VFS.load(image_path, checksums=True)
+    change(image)
+    files = list(generate_entries(200, content_size=32, seed=2))
+    del files[5]
+    files[-1] = dict(files[-1], content='другое', encoding='plain')
+    files.append({'name': 'added', 'type': 'file', 'path': '/new/added', 'content': 'x', 'encoding': 'plain'})
+    write_image(image_path, files)
+    diff = image.diff_image()
+    image.write_file('/new/text', 'после разбора')  # изменение между diff_image и apply_diff
+    image.apply_diff(diff)
+    try:
+        fresh = VFS.load(image_path)
+        try:
+            assert snapshot(image) == snapshot(fresh)
+        finally:
+            fresh.close()
+    finally:
+        image.close()
+
+
+def test_stale_diff_after_compact(image_path):
+    image = VFS.load(image_path, checksums=True)
+    change(image)
+    write_image(image_path, list(generate_entries(150, content_size=32, seed=3)))
+    diff = image.diff_image()
+    compact(image)  # свертка записывает текущее состояние поверх внешнего образа
+    expected = snapshot(image)
+    assert image.apply_diff(diff) == {'added': 0, 'changed': 0, 'removed': 0}
+    assert snapshot(image) == expected
+    image.close()
+
+
+def test_reload_motd(image_path):
+    files = list(generate_entries(50, content_size=32, seed=4))
+    motd = {'name': 'motd', 'type': 'file', 'path': '/motd', 'content': 'первый', 'encoding': 'plain'}
+    etc = {'name': 'motd', 'type': 'file', 'path': '/etc/motd', 'content': 'второй', 'encoding': 'plain'}
+    write_image(image_path, files + [motd, etc])
+    image = VFS.load(image_path, checksums=True)
+    try:
+        assert image.motd.path() == '/motd'
+        for version in (files + [etc], [motd] + files + [etc]):  # первый motd удален, затем снова появился
+            write_image(image_path, version)
+            image.apply_diff(image.diff_image())
+            fresh = VFS.load(image_path)
+            try:
+                assert image.motd.path() == fresh.motd.path()
+            finally:
+                fresh.close()
+    finally:
+        image.close()
@@ -0,0 +1,119 @@
+import json
+import random
+import zlib
+
+import pytest
+
+import vfs
+from vfs import VFS, iter_json_entries
+
+ALPHABET = 'ab "\\/\t\nяж😀\u0000{}[],:'  # кавычки, обратные слеши, управляющие символы, не-ASCII и суррогатные пары
+
+
+def random_text(rng, size):
+    return ''.join(rng.choice(ALPHABET) for _ in range(size))
+
+
+def fuzz_image(seed, count=300):
+    """Образ с неудобными для потокового разбора записями: экранирование, вложенные поля, content не строкой"""
+    rng = random.Random(seed)
+    files = []
+    for i in range(count):
+        entry = {'name': f'f{i}"content": "x\\', 'type': rng.choice(['file', 'directory']),
+                 'path': f'/d{i % 7}/x/f{i}'}
+        kind = rng.random()
+        if kind < 0.6:
+            entry['content'] = random_text(rng, rng.choice([0, 1, 5, 40, 3000]))  # есть длиннее блока разбора
+        elif kind < 0.7:
+            entry['content'] = None
+        elif kind < 0.75:
+            entry['content'] = 12.5
+        entry['encoding'] = rng.choice(['plain', 'base64'])
+        if rng.random() < 0.3:
+            entry['extra'] = [1, {'a': None, 'content': 'вложенный'}, 'q\\"']
+        if rng.random() < 0.2:
+            entry['content_ref'] = [1, 2]  # собственное поле образа с именем как у служебного
+        keys = list(entry)
+        rng.shuffle(keys)
+        files.append({key: entry[key] for key in keys})
+    files.insert(5, 'не объект')
+    files.insert(9, [1, 2])
+    return {'meta': {'x': [1, 2500.0, 'q'], 'files': 'не тот раздел'}, 'files': files, 'tail': {'content': 'x'}}
+
+
+def write_image(path, image, seed):
+    rng = random.Random(seed)
+    indent = rng.choice([None, 0, 2])
+    separators = rng.choice([(',', ':'), (', ', ': '), (' ,\n', ' :\t')])
+    path.write_text(json.dumps(image, ensure_ascii=rng.random() < 0.5, indent=indent, separators=separators),
+                    encoding='utf-8')
+
+
+def expected_entries(image):
+    for entry in image['files']:
+        if isinstance(entry, dict):
+            yield entry
+
+
+@pytest.mark.parametrize('chunk_size', [7, 16, 64, 1 << 20])
+@pytest.mark.parametrize('seed', range(4))
+def test_stream_matches_json_load(tmp_path, monkeypatch, chunk_size, seed):
+    monkeypatch.setattr(vfs._JSONScanner, 'CHUNK_SIZE', chunk_size)
+    image = fuzz_image(seed)
+    path = tmp_path / 'image.json'
+    write_image(path, image, seed)
+    data = path.read_bytes()
+
+    with open(path, 'rb') as f:
+        parsed = list(iter_json_entries(f, checksums=True))
+    expected = list(expected_entries(image))
+    assert len(parsed) == len(expected)
+    for (entry, ref, crc), original in zip(parsed, expected):
+        content = original.get('content')
+        if isinstance(content, str):
+            offset, length = ref
+            literal = data[offset:offset + length]
+            assert json.loads(literal) == content
+            assert crc == zlib.crc32(literal)
+            original = {key: value for key, value in original.items() if key != 'content'}
+        else:
+            assert ref is None and crc is None
+        assert entry == original
+
+
+def test_progress_reaches_end(tmp_path, monkeypatch):
+    monkeypatch.setattr(vfs._JSONScanner, 'CHUNK_SIZE', 64)
+    path = tmp_path / 'image.json'
+    write_image(path, fuzz_image(0, count=50), 0)
+    reported = []
+    with open(path, 'rb') as f:
+        list(iter_json_entries(f, progress=reported.append))
+    assert reported == sorted(reported) and reported[-1] == 1.0
+
+
+def test_own_content_ref_field_is_not_a_location(tmp_path):
+    path = tmp_path / 'image.json'
+    path.write_text(json.dumps({'files': [
+        {'name': 'a', 'type': 'file', 'path': '/a', 'content_ref': [1, 2]},
+        {'name': 'b', 'type': 'file', 'path': '/b', 'content': 'текст', 'content_ref': [1, 2]},
+    ]}), encoding='utf-8')
+    image = VFS.load(str(path), journal=False)
+    try:
+        assert image.read_text(image.lookup('/a')) == ''
+        assert image.read_text(image.lookup('/b')) == 'текст'
+        assert image.lookup('/a').entry()['content_ref'] == [1, 2]
+    finally:
+        image.close()
+
+
+@pytest.mark.parametrize('text, message', [
+    ('[]', 'объектом JSON'),
+    ('{"files": {}}', 'массивом'),
+    ('{"files": [{"content": "abc', 'незакрытая строка'),
+    ('{"files": []} x', 'лишние данные'),
+])
+def test_format_errors(tmp_path, text, message):
+    path = tmp_path / 'image.json'
+    path.write_text(text, encoding='utf-8')
+    with open(path, 'rb') as f, pytest.raises(vfs.VFSFormatError, match=message):
+        list(iter_json_entries(f))
@@ -0,0 +1,88 @@
+import base64
+import json
+
+import pytest
+
+from vfs import VFS, PACK_RECORD
+from vfs_convert import json_to_pack, pack_to_json
+from vfs_gen import generate_entries
+
+SPECIAL = [
+    {'name': 'motd', 'type': 'file', 'path': '/motd', 'content': 'привет\n', 'encoding': 'plain'},
+    {'name': 'bad', 'type': 'file', 'path': '/deep/er/bad', 'content': 'abc', 'encoding': 'base64'},
+    {'name': 'empty', 'type': 'file', 'path': '/deep/empty', 'content': ''},
+    {'name': 'другое имя', 'type': 'file', 'path': '/deep/named', 'content': 'x', 'encoding': 'plain'},
+    {'name': 'dir', 'type': 'directory', 'path': '/deep/er'},
+]
+
+
+def state(image):
+    """Все, что видно через команды: пути, типы, имена, кодировки, содержимое или ошибка, итоги du"""
+    result = {}
+    for path, node in image.walk('/'):
+        try:
+            text = image.decode_text(node) if node.is_file else None
+        except ValueError as e:
+            text = type(e).__name__
+        result[path] = (node.kind, node.explicit, node.entry_name, node.encoding, text, node.count)
+    return result, image.motd.path() if image.motd else None
+
+
+@pytest.fixture
+def image_json(tmp_path):
+    path = tmp_path / 'image.json'
+    files = list(generate_entries(300, content_size=64, seed=1)) + SPECIAL
+    path.write_text(json.dumps({'files': files}, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def load_state(path):
+    image = VFS.load(path, journal=False)
+    try:
+        return state(image)
+    finally:
+        image.close()
+
+
+def test_record_size():
+    assert PACK_RECORD.size == 40
+
+
+def test_round_trip(image_json, tmp_path):
+    packed, back, repacked = (str(tmp_path / name) for name in ('image.vfsp', 'back.json', 'again.vfsp'))
+    json_to_pack(image_json, packed)
+    pack_to_json(packed, back)
+    json_to_pack(back, repacked)
+    original = load_state(image_json)
+    assert load_state(packed) == original
+    assert load_state(back) == original
+    assert load_state(repacked) == original
+
+
+def test_bad_base64_survives_conversion(image_json, tmp_path):
+    packed = str(tmp_path / 'image.vfsp')
+    json_to_pack(image_json, packed)
+    image = VFS.load(packed, journal=False)
+    try:
+        with pytest.raises(ValueError):
+            image.read_text(image.lookup('/deep/er/bad'))
+        assert image.read_text(image.lookup('/motd')) == 'привет\n'
+    finally:
+        image.close()
+
+
+def test_du_same_for_json_and_pack(tmp_path):
+    # размеры 1..3 байта дают base64 с двумя, одним и без дополнения '='
+    files = [{'name': 'f%d' % n, 'type': 'file', 'path': '/b/f%d' % n,
+              'content': base64.b64encode(b'x' * n).decode(), 'encoding': 'base64'} for n in (1, 2, 3, 4)]
+    path, packed = str(tmp_path / 'image.json'), str(tmp_path / 'image.vfsp')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'files': files}, f)
+    json_to_pack(path, packed)
+    for name in (path, packed):
+        image = VFS.load(name, journal=False)
+        try:
+            assert [image.file_size(image.lookup('/b/f%d' % n)) for n in (1, 2, 3, 4)] == [1, 2, 3, 4]
+            assert image.lookup('/b').size == 10
+        finally:
+            image.close()
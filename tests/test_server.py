@@ -0,0 +1,13 @@
+import asyncio
+
+import pytest
+
+from shell_server import ShellServer
+
+
+def test_listen_path_not_socket(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('не сокет')
+    with pytest.raises(FileExistsError):
+        asyncio.run(ShellServer().serve(str(path)))
+    assert path.read_text() == 'не сокет'
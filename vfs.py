@@ -0,0 +1,1240 @@
+import base64
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def normalize_path(path):
+    """Нормализация абсолютного пути VFS"""
+    path = os.path.normpath(path).replace('\\', '/')  # нормализуем путь
+    if path.startswith('//'):  # posix normpath сохраняет двойной слеш в начале
+        path = '/' + path.lstrip('/')
+    return path
+
+
+# бинарный формат образа: заголовок, отсортированная таблица путей, строки, данные файлов
+PACK_MAGIC = b'VFSPACK\x01'
+PACK_HEADER = struct.Struct('<8sIIIIQQ')  # magic, версия, записей, motd, резерв, смещение строк, смещение данных
+# путь, имя, родитель, тип, кодировка, флаги, смещение и длина данных
+PACK_RECORD = struct.Struct('<IIIIIBBBxQQ')
+PACK_VERSION = 1
+PACK_NO_ID = 0xFFFFFFFF
+PACK_TYPES = ('file', 'directory')
+PACK_ENCODINGS = (None, 'plain', 'base64')  # None - поле encoding в записи отсутствовало
+PACK_IMPLICIT = 0x01  # папка, которой не было в исходном JSON
+PACK_HAS_DATA = 0x02  # у записи есть содержимое
+PACK_LITERAL = 0x04  # данные - нераскодированный литерал из JSON (base64 с ошибкой), а не сырые байты
+
+JOURNAL_SUFFIX = '.journal'  # журнал изменений лежит рядом с образом: <образ>.journal
+
+
+def image_stamp(path):
+    """Признаки изменения файла образа без его чтения"""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class ContentCache:
+    """LRU кэш раскодированного содержимого файлов с бюджетом в байтах"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()  # ключ -> (текст, размер), от старых к новым
+        self.size = 0  # занятый объем в байтах
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self.items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)  # отмечаем как недавно использованный
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, text):
+        size = sys.getsizeof(text)  # реальный объем строки в памяти
+        if size > self.max_bytes:  # слишком большой файл не вытесняет весь кэш
+            return
+        with self._lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.items[key] = (text, size)
+            self.size += size
+            while self.size > self.max_bytes:  # вытесняем давно не использованные записи
+                _, (_, evicted_size) = self.items.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+
+    def stats(self):
+        """Счетчики для подбора размера кэша"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.items), 'bytes': self.size, 'max_bytes': self.max_bytes}
+
+
+# поля записи образа, которые хранятся в слотах узла; остальные попадают в extra
+_SLOT_FIELDS = frozenset(('name', 'type', 'path', 'encoding', 'content'))
+
+
+class Node:
+    """Узел индекса VFS: запись образа в слотах вместо словаря.
+
+    Полный путь не хранится - вместо него имя (интернированная компонента
+    пути) и ссылка на родителя. У неявных папок, которых нет в образе,
+    explicit ложен. Содержимое - строка в памяти (после write) или смещение
+    и длина в файле образа: литерал JSON или сырые данные бинарного образа.
+    """
+
+    __slots__ = ('name', 'parent', 'children', 'listing', 'type', 'explicit', 'encoding', 'content',
+                 'offset', 'length', 'crc', 'extra', 'size', 'count')
+
+    def __init__(self, name, parent, node_type='directory'):
+        self.name = name
+        self.parent = parent
+        self.children = None  # имя -> узел; словарь заводится только у узлов с детьми
+        self.listing = None  # кэш отсортированных детей, сбрасывается при изменении папки
+        self.type = node_type
+        self.explicit = False
+        self.encoding = None
+        self.content = None
+        self.offset = None
+        self.length = 0
+        self.crc = None  # crc32 содержимого в образе, если VFS загружена с checksums
+        self.extra = None  # прочие поля записи образа
+        self.size = 0  # байт во всем поддереве
+        self.count = 0  # записей в поддереве без самого узла
+
+    def assign(self, entry, ref=None, crc=None):
+        """Перенос полей записи образа в слоты; путь не сохраняется, имя - если отличается от компоненты.
+
+        ref - (смещение, длина) содержимого в файле образа, crc - его crc32.
+        """
+        node_type = entry.get('type', 'file')
+        self.type = sys.intern(node_type) if isinstance(node_type, str) else node_type
+        encoding = entry.get('encoding')
+        self.encoding = sys.intern(encoding) if isinstance(encoding, str) else encoding
+        content = entry.get('content')
+        self.content = content if isinstance(content, str) else None
+        self.offset, self.length = ref if ref is not None else (None, 0)
+        self.crc = crc
+        extra = {} if _SLOT_FIELDS.issuperset(entry) else {
+            key: value for key, value in entry.items() if key not in _SLOT_FIELDS}
+        if entry.get('name', self.name) != self.name:
+            extra['name'] = entry['name']
+        if 'content' in entry and self.content is None:  # null и прочие не-строки хранятся как есть
+            extra['content'] = content
+        self.extra = extra or None
+        self.explicit = True
+
+    def reset(self):
+        """Превращение в неявную папку: поля записи сбрасываются, дети остаются"""
+        self.type = 'directory'
+        self.explicit = False
+        self.encoding = self.content = self.offset = self.crc = self.extra = None
+        self.length = 0
+
+    @property
+    def entry_name(self):
+        """Поле name записи образа; почти всегда совпадает с последней компонентой пути"""
+        if self.extra is not None and 'name' in self.extra:
+            return self.extra['name']
+        return self.name
+
+    @property
+    def kind(self):
+        """Тип в листингах: узел с детьми показывается папкой"""
+        return 'directory' if self.children else self.type
+
+    @property
+    def is_file(self):
+        return self.explicit and self.type == 'file'
+
+    def path(self):
+        """Полный путь, собранный по ссылкам на родителей"""
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return '/' + '/'.join(reversed(names))
+
+    def within(self, ancestor):
+        """Лежит ли узел в поддереве ancestor (включая его самого)"""
+        node = self
+        while node is not None:
+            if node is ancestor:
+                return True
+            node = node.parent
+        return False
+
+    def entry(self):
+        """Запись образа без содержимого, как в схеме deep_vfs.json"""
+        entry = {'name': self.name, 'type': self.type, 'path': self.path()}
+        if self.encoding is not None:
+            entry['encoding'] = self.encoding
+        if self.extra:
+            entry.update(self.extra)
+        return entry
+
+
+def _listing_order(node):
+    return node.kind != 'directory', node.name  # сначала папки, потом файлы
+
+
+class VFS:
+    """Иерархический индекс VFS: дерево узлов от корня, путь разрешается по компонентам"""
+
+    DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, cache_bytes=DEFAULT_CACHE_BYTES, checksums=False):
+        # корень существует всегда, даже если в образе нет ни одной записи
+        self.root = Node('', None)
+        self.motd = None  # узел первой записи motd в порядке образа
+        self.source = None  # открытый файл образа для ленивого чтения содержимого
+        self.pack = None  # mmap бинарного образа; если он есть, смещения узлов указывают в него
+        self._source_lock = threading.Lock()
+        self.content_cache = ContentCache(cache_bytes)
+        self.text_index = None  # необязательный индекс n-грамм для grep, строится командой index
+        self.image_path = None  # путь базового образа, нужен для compact
+        self.journal_path = None  # журнал изменений; None - изменения только в памяти
+        self.journal = None  # файл журнала, открывается при первом изменении
+        self.replaying = False  # идет воспроизведение журнала: изменения в него не пишутся
+        self.read_only = False  # запрет изменений (пакетный и серверный режимы)
+        self.checksums = checksums  # хранить crc32 содержимого в записях - нужно для горячей перезагрузки
+        self.image_stamp = None  # mtime, размер и inode образа на момент загрузки
+        self._last_parent_path = None  # папка предыдущей добавленной записи: образ обычно идет папка за папкой
+        self._last_parent = None
+
+    @classmethod
+    def load_json(cls, path, progress=None, phases=None, **kwargs):
+        """Потоковая загрузка JSON образа: в памяти только метаданные записей"""
+        vfs = cls(**kwargs)
+        vfs.source = open(path, 'rb')
+        try:
+            if phases is None:
+                for entry, ref, crc in iter_json_entries(vfs.source, progress, vfs.checksums):
+                    vfs.add_entry(entry, ref, crc)
+            else:  # с замером: время разбора и построения индекса отдельно
+                clock = time.perf_counter_ns
+                index_ns = 0
+                started = clock()
+                for entry, ref, crc in iter_json_entries(vfs.source, progress, vfs.checksums):
+                    t = clock()
+                    vfs.add_entry(entry, ref, crc)
+                    index_ns += clock() - t
+                phases['parse'] = clock() - started - index_ns
+                phases['index'] = index_ns
+            started = time.perf_counter_ns()
+            vfs.compute_totals()
+            if phases is not None:
+                phases['totals'] = time.perf_counter_ns() - started
+        except BaseException:
+            vfs.close()
+            raise
+        return vfs
+
+    @classmethod
+    def load(cls, path, progress=None, phases=None, journal=True, **kwargs):
+        """Загрузка образа с определением формата по сигнатуре.
+
+        progress, если задан, вызывается с долей выполненной работы от 0 до 1.
+        В словарь phases, если он передан, записывается время фаз загрузки в нс.
+        journal - воспроизвести журнал изменений образа и писать в него новые.
+        """
+        stamp = image_stamp(path)  # до чтения: изменение во время загрузки заметит следующая проверка
+        with open(path, 'rb') as f:
+            magic = f.read(len(PACK_MAGIC))
+        if magic == PACK_MAGIC:
+            vfs = cls.load_pack(path, progress, phases, **kwargs)
+        else:
+            vfs = cls.load_json(path, progress, phases, **kwargs)
+        vfs.image_path = path
+        vfs.image_stamp = stamp
+        if journal:
+            started = time.perf_counter_ns()
+            vfs.replay_journal(path + JOURNAL_SUFFIX)
+            if phases is not None:
+                phases['journal'] = time.perf_counter_ns() - started
+        return vfs
+
+    @classmethod
+    def load_pack(cls, path, progress=None, phases=None, **kwargs):
+        """Загрузка бинарного образа через mmap: разбирается только таблица путей"""
+        vfs = cls(**kwargs)
+        vfs.source = open(path, 'rb')
+        try:
+            started = time.perf_counter_ns()
+            vfs.pack = mmap.mmap(vfs.source.fileno(), 0, access=mmap.ACCESS_READ)
+            mapped = time.perf_counter_ns()
+            vfs._add_pack_records(memoryview(vfs.pack), progress)
+            indexed = time.perf_counter_ns()
+            vfs.compute_totals()
+            if phases is not None:
+                phases['mmap'] = mapped - started
+                phases['index'] = indexed - mapped
+                phases['totals'] = time.perf_counter_ns() - indexed
+        except BaseException:
+            vfs.close()
+            raise
+        return vfs
+
+    PACK_PROGRESS_STEP = 65536  # как часто сообщать о прогрессе, в записях
+
+    def _add_pack_records(self, view, progress=None):
+        """Построение индекса по таблице путей бинарного образа"""
+        count, motd_id = _pack_header(view)[:2]
+        nodes_by_id = []
+        for path, node_type, parent, entry, ref, crc in _iter_pack_entries(view, self.checksums):
+            if path == '/':
+                node = self.root
+            else:
+                # записи отсортированы по пути, поэтому родитель всегда уже создан
+                node = Node(sys.intern(path.rsplit('/', 1)[1]), nodes_by_id[parent], node_type)
+                self._link(node)
+            nodes_by_id.append(node)
+            if progress is not None and len(nodes_by_id) % self.PACK_PROGRESS_STEP == 0:
+                progress(len(nodes_by_id) / count)
+            if entry is not None:
+                node.assign(entry, ref, crc)
+        if motd_id != PACK_NO_ID:
+            self.motd = nodes_by_id[motd_id]
+
+    def close(self):
+        """Закрытие файла образа и журнала"""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if self.pack is not None:
+            try:
+                self.pack.close()
+            except BufferError:  # кто-то еще держит срез; mmap закроется вместе с ним
+                pass
+            self.pack = None
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+
+    def read_bytes(self, node):
+        """Сырые байты файла; для бинарного образа - срез mmap без копирования"""
+        if self.pack is not None and node.offset is not None:
+            return memoryview(self.pack)[node.offset:node.offset + node.length]
+        content = self.read_content(node)
+        if node.encoding == 'base64':
+            return base64.b64decode(content)
+        return content.encode('utf-8')
+
+    def read_content(self, node):
+        """Содержимое записи JSON образа в том виде, как оно хранится в образе"""
+        if node.content is not None:  # содержимое уже в памяти
+            return node.content
+        if node.offset is None:
+            return ''
+        return _decode_literal(self._read_at(node.offset, node.length))
+
+    def read_text(self, node):
+        """Раскодированное содержимое файла через LRU кэш"""
+        text = self.content_cache.get(node)
+        if text is None:
+            text = self.decode_text(node)
+            self.content_cache.put(node, text)
+        return text
+
+    def decode_text(self, node):
+        """Раскодированное содержимое файла мимо кэша (для полных обходов)"""
+        if self.pack is not None and node.offset is not None:  # бинарный образ: декодируем прямо из mmap
+            with self.read_bytes(node) as data:
+                return str(data, 'utf-8')
+        text = self.read_content(node)
+        if node.encoding == 'base64':  # ошибки декодирования пробрасываем вызывающему
+            text = base64.b64decode(text).decode('utf-8')
+        return text
+
+    def file_size(self, node):
+        """Размер файла в байтах без чтения содержимого.
+
+        Для бинарного образа размер точный; для JSON образа он оценивается по
+        длине литерала (без учета escape-последовательностей).
+        """
+        if node.offset is None:
+            content = node.content
+            if content is None:
+                return 0
+            if node.encoding == 'base64':
+                return len(content) * 3 // 4 - (len(content) - len(content.rstrip('=')))
+            return len(content.encode('utf-8'))
+        if self.pack is not None:
+            return node.length
+        length = max(0, node.length - 2)  # без кавычек
+        if node.encoding == 'base64':
+            # дополнение '=' видно по двум последним символам литерала
+            tail = self._read_at(node.offset + node.length - 3, 2) if length >= 2 else b''
+            return length * 3 // 4 - tail.count(b'=')
+        return length
+
+    def compute_totals(self):
+        """Размер и число записей каждого поддерева за один обход после загрузки"""
+        stack = [(self.root, False)]
+        while stack:  # обход без рекурсии: глубина образа не ограничена
+            node, children_done = stack.pop()
+            children = node.children
+            if not children_done:
+                stack.append((node, True))
+                if children:
+                    stack.extend((child, False) for child in children.values())
+                continue
+            size = self.file_size(node) if node.is_file else 0
+            count = 0
+            if children:
+                for child in children.values():
+                    size += child.size
+                    count += 1 + child.count
+            node.size = size
+            node.count = count
+
+    def _read_at(self, offset, length):
+        """Чтение фрагмента файла образа, не сдвигая общую позицию"""
+        if hasattr(os, 'pread'):  # безопасно для потоков и процессов после fork
+            return os.pread(self.source.fileno(), length, offset)
+        with self._source_lock:
+            self.source.seek(offset)
+            return self.source.read(length)
+
+    def add_entry(self, entry, ref=None, crc=None):
+        """Добавление записи в индекс вместе с неявными родительскими папками; ref и crc - как у Node.assign"""
+        path = entry.get('path', '')
+        if not isinstance(path, str) or not path.startswith('/'):  # записи без абсолютного пути недостижимы
+            return
+        node = self._ensure_node(normalize_path(path), entry.get('type', 'file'))
+        if not node.explicit:  # при дубликатах побеждает первая запись, как при линейном поиске
+            node.assign(entry, ref, crc)
+            if self.motd is None and node.entry_name == 'motd' and node.type == 'file':
+                self.motd = node
+
+    def _ensure_node(self, path, node_type):
+        """Узел пути; недостающие предки создаются неявными папками"""
+        if path == '/':
+            return self.root
+        parent_path, name = path.rsplit('/', 1)
+        if parent_path == self._last_parent_path:  # соседние записи одной папки не проходят путь заново
+            parent = self._last_parent
+        else:
+            parent = self.root
+            for part in parent_path.split('/')[1:]:
+                parent = self._child(parent, part, 'directory')
+            self._last_parent_path, self._last_parent = parent_path, parent
+        return self._child(parent, name, node_type)
+
+    def _child(self, parent, name, node_type):
+        """Ребенок по имени; если его нет, создается"""
+        node = parent.children.get(name) if parent.children else None
+        if node is None:
+            node = Node(sys.intern(name), parent, node_type)  # одинаковые имена в разных папках - один объект
+            self._link(node)
+        return node
+
+    def _link(self, node):
+        """Подвешивание узла к его родителю"""
+        parent = node.parent
+        if parent.children is None:
+            parent.children = {}
+            if parent.parent is not None:  # у родителя появились дети - в листинге деда он теперь папка
+                parent.parent.listing = None
+        parent.children[node.name] = node
+        parent.listing = None
+
+    def _unlink(self, node):
+        """Отцепление узла от родителя; ссылка node.parent остается"""
+        parent = node.parent
+        del parent.children[node.name]
+        parent.listing = None
+        if not parent.children:
+            parent.children = None
+            if parent.parent is not None:
+                parent.parent.listing = None
+        self._last_parent_path = self._last_parent = None
+
+    def node(self, path):
+        """Узел по нормализованному пути за O(глубина); None если пути нет"""
+        if not path.startswith('/'):
+            return None
+        node = self.root
+        if path == '/':
+            return node
+        for name in path[1:].split('/'):
+            children = node.children
+            if children is None:
+                return None
+            node = children.get(name)
+            if node is None:
+                return None
+        return node
+
+    def lookup(self, path):
+        """Узел записи по нормализованному пути; неявные папки тоже находятся"""
+        return self.node(path)
+
+    def exists(self, path):
+        """Проверка существования пути (включая неявные папки)"""
+        return self.node(path) is not None
+
+    def list(self, path):
+        """Дети папки кортежем узлов без копирования; None если пути нет"""
+        node = self.node(path)
+        if node is None:
+            return None
+        return self.sorted_children(node)
+
+    def sorted_children(self, node):
+        """Дети узла: сначала папки, потом файлы; кортеж кэшируется до изменения папки"""
+        listing = node.listing
+        if listing is None:
+            children = node.children
+            listing = node.listing = tuple(sorted(children.values(), key=_listing_order)) if children else ()
+        return listing
+
+    def walk(self, path):
+        """Обход поддерева в глубину: пары (путь, узел) в порядке sorted_children"""
+        node = self.node(path)
+        if node is None:
+            return
+        stack = [(path, node)]
+        while stack:
+            path, node = stack.pop()
+            yield path, node
+            prefix = '' if path == '/' else path
+            stack.extend((f"{prefix}/{child.name}", child) for child in reversed(self.sorted_children(node)))
+
+    def iter_nodes(self, node=None):
+        """Все узлы поддерева в прямом порядке без сборки путей и сортировки.
+
+        Дети каждого узла копируются перед обходом, поэтому генератор можно
+        использовать из фонового потока, пока главный поток меняет дерево.
+        """
+        stack = [node or self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            children = node.children
+            if children:
+                stack.extend(reversed(list(children.values())))
+
+    def replay_journal(self, journal_path):
+        """Применение записанных изменений; новые изменения дописываются в этот же журнал"""
+        self.journal_path = journal_path
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path, 'r', encoding='utf-8') as journal:
+            self._replay(_journal_records(journal))
+
+    def _replay(self, records):
+        """Повтор разобранных записей журнала без повторной записи в журнал"""
+        operations = {'mkdir': self.mkdir, 'touch': self.touch, 'write': self.write_file, 'rm': self.remove}
+        self.replaying = True
+        try:
+            for record in records:
+                try:
+                    operation = operations[record['op']]
+                    args = [record['path']] + ([record['text']] if record['op'] == 'write' else [])
+                    if record['op'] == 'rm':
+                        args.append(record.get('recursive', False))
+                except (KeyError, TypeError):
+                    continue
+                try:
+                    operation(*args)
+                except VFSOperationError:
+                    # журнал уже мог быть частично применен к образу (сбой посреди compact):
+                    # операции задают итоговое состояние, поэтому повтор можно пропустить
+                    continue
+        finally:
+            self.replaying = False
+
+    def _read_journal(self, start):
+        """Полные строки журнала начиная с байта start и позиция за последней из них"""
+        if self.journal_path is None:
+            return [], start
+        try:
+            with open(self.journal_path, 'rb') as journal:
+                journal.seek(start)
+                data = journal.read()
+        except FileNotFoundError:
+            return [], start
+        end = data.rfind(b'\n') + 1  # строку, которую как раз дописывают, дочитает apply_diff
+        return data[:end].decode('utf-8', errors='replace').split('\n'), start + end
+
+    def _log(self, record):
+        """Дописывание изменения в журнал до его применения к индексу"""
+        if self.replaying or self.journal_path is None:
+            return
+        if self.journal is None:
+            self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        self.journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.journal.flush()  # одна короткая запись вместо перезаписи всего образа
+
+    def _check_writable(self, path):
+        """Проверки перед изменением; нормализованный путь"""
+        if self.read_only:
+            raise VFSOperationError("VFS открыта только для чтения")
+        if not path.startswith('/'):
+            raise VFSOperationError(f"путь '{path}' должен быть абсолютным")
+        return normalize_path(path)
+
+    def _parent_dir(self, path):
+        """Узел родительской папки нового пути"""
+        if self.node(path) is not None:
+            raise VFSOperationError(f"'{path}' уже существует")
+        parent = self.node(path.rsplit('/', 1)[0] or '/')
+        if parent is None:
+            raise VFSOperationError(f"папка для '{path}' не существует")
+        if parent.type != 'directory' and not parent.children:
+            raise VFSOperationError(f"'{path.rsplit('/', 1)[0]}' не является папкой")
+        return parent
+
+    def _attach(self, parent, path, node_type):
+        """Новая запись в индексе вместе с итогами предков"""
+        node = Node(sys.intern(path.rsplit('/', 1)[1]), parent, node_type)
+        node.explicit = True
+        self._link(node)
+        self._update_totals(node, 0, 1)
+        if self.motd is None and node.name == 'motd' and node_type == 'file':
+            self.motd = node
+        return node
+
+    def _update_totals(self, node, size_delta, count_delta):
+        """Поправка итогов du у всех предков узла"""
+        node = node.parent
+        while node is not None:
+            node.size += size_delta
+            node.count += count_delta
+            node = node.parent
+
+    def mkdir(self, path):
+        path = self._check_writable(path)
+        parent = self._parent_dir(path)
+        self._log({'op': 'mkdir', 'path': path})
+        self._attach(parent, path, 'directory')
+
+    def touch(self, path):
+        """Создание пустого файла; существующий путь не меняется"""
+        path = self._check_writable(path)
+        if self.node(path) is not None:
+            return
+        parent = self._parent_dir(path)
+        self._log({'op': 'touch', 'path': path})
+        node = self._attach(parent, path, 'file')
+        node.content, node.encoding = '', 'plain'
+
+    def write_file(self, path, text):
+        """Замена содержимого файла (файл создается, если его нет)"""
+        path = self._check_writable(path)
+        node = self.node(path)
+        if node is None:
+            parent = self._parent_dir(path)
+        elif node.kind == 'directory':
+            raise VFSOperationError(f"'{path}' является папкой")
+        self._log({'op': 'write', 'path': path, 'text': text})
+        if node is None:
+            node = self._attach(parent, path, 'file')
+        self.content_cache.invalidate(node)
+        node.offset, node.length, node.crc = None, 0, None  # старое содержимое в образе больше не нужно
+        node.content = text
+        node.encoding = 'plain'
+        if node.extra is not None:
+            node.extra.pop('content', None)
+        size = self.file_size(node)
+        self._update_totals(node, size - node.size, 0)
+        node.size = size
+        if self.text_index is not None:
+            self.text_index.add(node, text)
+
+    def remove(self, path, recursive=False):
+        """Удаление файла или папки; непустая папка - только с recursive"""
+        path = self._check_writable(path)
+        node = self.node(path)
+        if node is None:
+            raise VFSOperationError(f"'{path}' не существует")
+        if path == '/':
+            raise VFSOperationError("корневую папку удалить нельзя")
+        if node.children and not recursive:
+            raise VFSOperationError(f"папка '{path}' не пуста")
+        self._log({'op': 'rm', 'path': path, 'recursive': recursive})
+        for removed in self.iter_nodes(node):
+            if removed.explicit:
+                self._forget(removed)
+        self._update_totals(node, -node.size, -(node.count + 1))
+        self._unlink(node)
+
+    def replace_base(self, new_image):
+        """Подмена базового образа записанным new_image (compact): журнал очищается, индекс строится заново"""
+        image_path = self.image_path
+        was_pack = self.pack is not None
+        self.close()  # открытый файл нельзя подменить в Windows
+        try:
+            os.replace(new_image, image_path)
+        except OSError:
+            # старый образ на месте, смещения узлов в нем по-прежнему верны
+            self.source = open(image_path, 'rb')
+            if was_pack:
+                self.pack = mmap.mmap(self.source.fileno(), 0, access=mmap.ACCESS_READ)
+            raise
+        # сбой до очистки журнала не страшен: повтор операций на новом образе дает то же состояние
+        if self.journal_path is not None:
+            open(self.journal_path, 'w').close()
+        fresh = type(self).load(image_path, journal=False, cache_bytes=self.content_cache.max_bytes,
+                                checksums=self.checksums)
+        self.source, self.pack = fresh.source, fresh.pack
+        self.image_stamp = fresh.image_stamp  # своя свертка не должна выглядеть как внешнее изменение
+        # дерево то же, что было записано, меняется только место содержимого: узлы остаются прежними,
+        # поэтому ссылки на них из кэша, индекса grep и motd верны
+        pairs = [(self.root, fresh.root)]
+        for node, new in pairs:
+            node.content, node.offset, node.length, node.crc = new.content, new.offset, new.length, new.crc
+            node.size = new.size  # оценка размера по длине литерала могла измениться
+            for name, child in (new.children or {}).items():
+                match = node.children.get(name) if node.children else None
+                if match is None:  # образ не совпал с деревом - берем новое дерево целиком
+                    self.root, self.motd = fresh.root, fresh.motd
+                    self.content_cache = ContentCache(self.content_cache.max_bytes)
+                    self.text_index = None
+                    return
+                pairs.append((match, child))
+
+    def image_changed(self):
+        """Изменился ли файл образа с момента загрузки (дешевая проверка по stat)"""
+        if self.image_path is None:
+            return False
+        try:
+            return image_stamp(self.image_path) != self.image_stamp
+        except OSError:  # файл как раз подменяют - проверим в следующий раз
+            return False
+
+    def diff_image(self):
+        """Разница между образом на диске и индексом по путям; None если файл не менялся.
+
+        Только читает индекс и новый файл, поэтому может выполняться в фоновом
+        потоке; применяет разницу apply_diff в потоке интерфейса.
+        """
+        stamp = image_stamp(self.image_path)
+        if stamp == self.image_stamp:
+            return None
+        started = time.perf_counter()
+        diff = ImageDiff(stamp, self.image_stamp)
+        diff.source = open(self.image_path, 'rb')
+        try:
+            if diff.source.read(len(PACK_MAGIC)) == PACK_MAGIC:
+                diff.pack = mmap.mmap(diff.source.fileno(), 0, access=mmap.ACCESS_READ)
+                diff.motd = _pack_motd_path(memoryview(diff.pack))
+                entries = (item[3:] for item in _iter_pack_entries(memoryview(diff.pack), checksums=True)
+                           if item[3] is not None)
+            else:
+                diff.source.seek(0)
+                entries = iter_json_entries(diff.source, checksums=True)
+            seen = set()  # встреченные узлы индекса и пути новых записей
+            for entry, ref, crc in entries:
+                path = entry.get('path', '')
+                if not isinstance(path, str) or not path.startswith('/'):  # как в add_entry
+                    continue
+                path = normalize_path(path)
+                node = self.node(path)
+                key = path if node is None else node
+                if key in seen:  # при дубликатах побеждает первая запись
+                    continue
+                seen.add(key)
+                if (diff.pack is None and diff.motd is None and entry.get('type', 'file') == 'file'
+                        and entry.get('name', path.rsplit('/', 1)[1]) == 'motd'):  # как в add_entry
+                    diff.motd = path
+                if node is None or not node.explicit:
+                    diff.added.append((path, entry, ref, crc))
+                    continue
+                probe = Node(node.name, None)
+                probe.assign(entry, ref, crc)
+                if not _same_entry(node, probe):
+                    diff.changed.append((path, entry, ref, crc))
+                elif (probe.offset, probe.length) != (node.offset, node.length):  # содержимое в файле сдвинулось
+                    diff.moved.append((node, node.offset, node.length, probe.offset, probe.length))
+            # iter_nodes копирует детей: индекс в это время может меняться командами в главном потоке
+            diff.removed = [node.path() for node in self.iter_nodes() if node.explicit and node not in seen]
+            # журнал разбирается здесь же, в главном потоке остается только повтор операций
+            lines, diff.journal_end = self._read_journal(0)
+            diff.journal = list(_journal_records(lines))
+            if image_stamp(self.image_path) != stamp:  # файл дописывается - возьмем его в следующий раз
+                diff.close()
+                return None
+        except BaseException:
+            diff.close()
+            self.image_stamp = stamp  # битую версию не разбираем повторно, пока файл снова не изменится
+            raise
+        diff.seconds = time.perf_counter() - started
+        return diff
+
+    def apply_diff(self, diff):
+        """Применение разницы: индекс, итоги du, кэш и индекс grep меняются только у отличающихся записей"""
+        if diff.base_stamp != self.image_stamp:  # образ сменили после diff_image (compact) - разница устарела
+            diff.close()
+            return {'added': 0, 'changed': 0, 'removed': 0}
+        # сначала переключаемся на новый файл: все ссылки на содержимое теперь указывают в него
+        for node, old_offset, old_length, offset, length in diff.moved:
+            if node.offset == old_offset and node.length == old_length:  # запись не меняли после diff_image
+                node.offset, node.length = offset, length
+        old_source, old_pack = self.source, self.pack
+        self.source, self.pack, self.image_stamp = diff.source, diff.pack, diff.stamp
+        diff.source = diff.pack = None
+        if old_pack is not None:
+            try:
+                old_pack.close()
+            except BufferError:
+                pass
+        if old_source is not None:
+            old_source.close()
+
+        # индекс мог измениться с момента diff_image, поэтому каждый шаг проверяет текущее состояние
+        for path in sorted(diff.removed, reverse=True):  # дети раньше родителей
+            self._drop_entry(path)
+        for path, entry, ref, crc in diff.changed + diff.added:
+            self._put_entry(path, entry, ref, crc)
+        # motd выбирается заново, как при загрузке: прежний мог исчезнуть, новый - оказаться раньше в образе
+        motd = self.node(diff.motd) if diff.motd is not None else None
+        self.motd = motd if motd is not None and motd.is_file else None
+        # локальные изменения поверх нового образа, как при запуске; строки, дописанные после diff_image, тоже
+        lines, _ = self._read_journal(diff.journal_end)
+        self._replay(diff.journal + list(_journal_records(lines)))
+        return {'added': len(diff.added), 'changed': len(diff.changed), 'removed': len(diff.removed)}
+
+    def _own_size(self, node):
+        """Размер самой записи без детей, как его считает compute_totals"""
+        return self.file_size(node) if node.is_file else 0
+
+    def _counted_size(self, node):
+        """Размер записи, учтенный в итогах: после смены файла образа file_size по старой ссылке неверен"""
+        return node.size - sum(child.size for child in node.children.values()) if node.children else node.size
+
+    def _forget(self, node):
+        """Сброс кэшей, которые ссылаются на старую запись"""
+        self.content_cache.invalidate(node)
+        if self.text_index is not None:
+            self.text_index.discard(node)
+        if node is self.motd:
+            self.motd = None
+
+    def _drop_entry(self, path):
+        """Удаление записи; папка с оставшимися детьми становится неявной"""
+        node = self.node(path)
+        if node is None or not node.explicit:
+            return
+        self._forget(node)
+        own = self._counted_size(node)
+        node.size -= own
+        self._update_totals(node, -own, 0)
+        node.reset()
+        if node.parent is not None:  # тип узла мог смениться - порядок в листинге родителя тоже
+            node.parent.listing = None
+        while node.parent is not None and not node.explicit and not node.children:  # пустые неявные папки не нужны
+            self._update_totals(node, 0, -1)
+            self._unlink(node)
+            node = node.parent
+
+    def _put_entry(self, path, entry, ref, crc):
+        """Новая или замененная запись вместе с неявными родителями"""
+        node = self.node(path)
+        if node is None:
+            node = Node(sys.intern(path.rsplit('/', 1)[1]), self._ensure_parent(path))
+            self._link(node)
+            self._update_totals(node, 0, 1)
+        elif node.explicit:
+            self._forget(node)
+        own = self._counted_size(node)
+        node.assign(entry, ref, crc)
+        if node.parent is not None:
+            node.parent.listing = None
+        delta = self._own_size(node) - own
+        node.size += delta
+        self._update_totals(node, delta, 0)
+        if self.text_index is not None and node.type == 'file':
+            try:
+                self.text_index.add(node, self.decode_text(node))
+            except ValueError:
+                pass
+
+    def _ensure_parent(self, path):
+        """Родительская папка пути; недостающие создаются неявными с учетом итогов du"""
+        parent = self.root
+        for name in path.split('/')[1:-1]:
+            child = parent.children.get(name) if parent.children else None
+            if child is None:
+                child = Node(sys.intern(name), parent)
+                self._link(child)
+                self._update_totals(child, 0, 1)
+            parent = child
+        return parent
+
+
+class ImageDiff:
+    """Разница между индексом и новой версией образа"""
+
+    def __init__(self, stamp, base_stamp=None):
+        self.stamp = stamp
+        self.base_stamp = base_stamp  # образ, с которым сравнивался индекс
+        self.source = None  # открытый новый файл образа
+        self.pack = None  # его mmap для бинарного формата
+        self.added = []  # (путь, запись, место содержимого, crc)
+        self.changed = []  # (путь, новая запись, место содержимого, crc)
+        self.removed = []  # пути
+        self.motd = None  # путь записи motd в новой версии
+        self.moved = []  # (узел, старые смещение и длина, новые): содержимое то же, сдвинулось место в файле
+        self.journal = []  # разобранные записи журнала
+        self.journal_end = 0  # до какого байта журнал просмотрен
+        self.seconds = 0.0  # время чтения и сравнения
+
+    def close(self):
+        """Закрытие нового файла, если разница так и не была применена"""
+        if self.pack is not None:
+            try:
+                self.pack.close()
+            except BufferError:
+                pass
+            self.pack = None
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+
+
+def _journal_records(lines):
+    """Записи журнала по строкам; недописанная последняя строка после сбоя пропускается"""
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and isinstance(record.get('path'), str):
+            yield record
+
+
+def _same_entry(old, new):
+    """Совпадают ли записи узлов с точностью до места содержимого в файле"""
+    if old.offset is not None and old.crc is None:  # без crc сравнить нельзя
+        return False
+    return (old.crc == new.crc and old.content == new.content and old.type == new.type
+            and old.encoding == new.encoding and old.extra == new.extra)
+
+
+def _pack_header(view):
+    """Проверенный заголовок бинарного образа: (записей, motd, смещение строк, смещение данных)"""
+    if len(view) < PACK_HEADER.size:
+        raise VFSFormatError("обрезанный заголовок образа", len(view))
+    magic, version, count, motd_id, _, strings_offset, data_offset = PACK_HEADER.unpack_from(view)
+    if magic != PACK_MAGIC or version != PACK_VERSION:
+        raise VFSFormatError("неподдерживаемая версия бинарного образа", 0)
+    table_end = PACK_HEADER.size + count * PACK_RECORD.size
+    if table_end > strings_offset or strings_offset > data_offset or data_offset > len(view):
+        raise VFSFormatError("повреждена таблица путей", PACK_HEADER.size)
+    return count, motd_id, strings_offset, data_offset
+
+
+def _pack_motd_path(view):
+    """Путь записи motd из заголовка бинарного образа или None"""
+    _, motd_id, strings_offset, _ = _pack_header(view)
+    if motd_id == PACK_NO_ID:
+        return None
+    path_off, path_len = PACK_RECORD.unpack_from(view, PACK_HEADER.size + motd_id * PACK_RECORD.size)[:2]
+    return str(view[strings_offset + path_off:strings_offset + path_off + path_len], 'utf-8')
+
+
+def _iter_pack_entries(view, checksums=False):
+    """Записи таблицы путей по порядку: (путь, тип, номер родителя, запись, место данных, crc).
+
+    У неявной папки запись None; место данных - (смещение, длина) в файле или None.
+    """
+    count, _, strings_offset, data_offset = _pack_header(view)
+    strings = view[strings_offset:data_offset]
+    for (path_off, path_len, name_off, name_len, parent, kind, encoding, flags,
+         data_off, data_len) in PACK_RECORD.iter_unpack(view[PACK_HEADER.size:PACK_HEADER.size + count * PACK_RECORD.size]):
+        path = str(strings[path_off:path_off + path_len], 'utf-8')
+        node_type = PACK_TYPES[kind]
+        if flags & PACK_IMPLICIT:
+            yield path, node_type, parent, None, None, None
+            continue
+        entry = {'name': str(strings[name_off:name_off + name_len], 'utf-8'), 'type': node_type, 'path': path}
+        if PACK_ENCODINGS[encoding] is not None:
+            entry['encoding'] = PACK_ENCODINGS[encoding]
+        ref = crc = None
+        if flags & PACK_LITERAL:  # битый base64 держим строкой, как в JSON: ошибку увидит cat этого файла
+            entry['content'] = str(view[data_offset + data_off:data_offset + data_off + data_len], 'utf-8')
+        elif flags & PACK_HAS_DATA:
+            ref = (data_offset + data_off, data_len)  # сырые байты внутри mmap
+            if checksums:
+                crc = zlib.crc32(view[data_offset + data_off:data_offset + data_off + data_len])
+        yield path, node_type, parent, entry, ref, crc
+
+
+class VFSOperationError(ValueError):
+    """Ошибка изменения VFS (путь не существует, уже существует, не папка и т.п.)"""
+
+
+class VFSFormatError(ValueError):
+    """Ошибка формата файла образа VFS"""
+
+    def __init__(self, message, offset):
+        super().__init__(f"{message} (байт {offset})")
+        self.offset = offset
+
+
+_WHITESPACE = re.compile(rb'[ \t\r\n]*')
+_LITERAL = re.compile(rb'-?[0-9][0-9.eE+\-]*|true|false|null')
+_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_MEMBER = _STRING + rb'[ \t\r\n]*:[ \t\r\n]*(?:' + _STRING + rb'|' + _LITERAL.pattern + rb')[ \t\r\n]*'
+_CONTENT_KEY = re.compile(rb'"content"[ \t\r\n]*:[ \t\r\n]*')
+# плоская запись образа: поля до content, сам content и поля после него
+_FLAT_HEAD = re.compile(rb'\{[ \t\r\n]*(?:(?!"content"[ \t\r\n]*:)' + _MEMBER + rb',[ \t\r\n]*)*', re.DOTALL)
+_FLAT_LAST = re.compile(rb'(?:' + _MEMBER + rb')?\}', re.DOTALL)
+_FLAT_TAIL = re.compile(rb'[ \t\r\n]*(?:,[ \t\r\n]*' + _MEMBER + rb')*\}', re.DOTALL)
+
+
+def _string_end(buf, i):
+    """Индекс закрывающей кавычки строки, тело которой начинается с i; -1 если ее нет в buf"""
+    while True:
+        j = buf.find(b'"', i)  # memchr вместо посимвольного разбора
+        if j < 0:
+            return -1
+        k = j - 1
+        while k >= i and buf[k] == 0x5C:  # считаем обратные слеши перед кавычкой
+            k -= 1
+        if (j - 1 - k) % 2 == 0:  # четное число слешей - кавычка не экранирована
+            return j
+        i = j + 1
+
+
+class _JSONScanner:
+    """Потоковый разбор JSON образа блоками фиксированного размера"""
+
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, f, progress=None, checksums=False):
+        self.f = f
+        self.checksums = checksums  # считать crc32 литералов content
+        self.buf = b''
+        self.base = 0  # смещение buf[0] в файле
+        self.pos = 0  # позиция разбора внутри buf
+        self.eof = False
+        self.progress = progress  # вызывается с долей прочитанного файла после каждого блока
+        self.total = os.fstat(f.fileno()).st_size if progress is not None else 0
+
+    def _fill(self, keep_from):
+        """Дочитывание блока; все до keep_from можно отбросить"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.base += keep_from
+        self.pos -= keep_from
+        self.buf = self.buf[keep_from:] + chunk
+        if self.progress is not None and self.total:
+            self.progress(min(1.0, (self.base + len(self.buf)) / self.total))
+        return True
+
+    def error(self, message):
+        raise VFSFormatError(message, self.base + self.pos)
+
+    def peek(self):
+        """Следующий значимый символ без его потребления"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos:self.pos + 1]
+            if not self._fill(self.pos):
+                return b''
+
+    def expect(self, char):
+        if self.peek() != char:
+            self.error(f"ожидался символ '{char.decode()}'")
+        self.pos += 1
+
+    def string_span(self, keep):
+        """Границы строкового литерала в файле; keep - держать его в буфере"""
+        if self.peek() != b'"':
+            self.error("ожидалась строка")
+        start = self.base + self.pos
+        i = self.pos + 1
+        while True:
+            end = _string_end(self.buf, i)
+            if end >= 0:
+                self.pos = end + 1
+                return start, self.base + self.pos
+            # литерал не поместился в буфер: без keep отбрасываем уже просмотренную часть,
+            # кроме хвоста из обратных слешей, который влияет на следующую кавычку
+            tail = len(self.buf)
+            while tail > i and self.buf[tail - 1] == 0x5C:
+                tail -= 1
+            keep_from = self.pos if keep else tail
+            i = tail - keep_from
+            if not self._fill(keep_from):
+                self.error("незакрытая строка")
+
+    def string(self):
+        """Строковый литерал целиком, уже раскодированный"""
+        start, end = self.string_span(keep=True)
+        raw = self.buf[start - self.base:end - self.base]
+        return _decode_literal(raw)
+
+    def literal(self):
+        """Число, true, false или null"""
+        self.peek()
+        while True:
+            m = _LITERAL.match(self.buf, self.pos)
+            if m and (m.end() < len(self.buf) or self.eof):
+                break
+            if not self._fill(self.pos):  # литерал мог оборваться на границе блока
+                m = _LITERAL.match(self.buf, self.pos)
+                break
+        if not m:
+            self.error("неожиданный символ")
+        self.pos = m.end()
+        return json.loads(m.group())
+
+    def flat_entry(self):
+        """Быстрый разбор плоской записи одним вызовом json.loads: (запись, место content, crc).
+
+        None если запись сложнее - ее разбирают по полям.
+        """
+        if len(self.buf) - self.pos < self.CHUNK_SIZE // 2:
+            self._fill(self.pos)  # чтобы типичная запись целиком лежала в буфере
+        buf, start = self.buf, self.pos
+        head = _FLAT_HEAD.match(buf, start)
+        if head is None:
+            return None
+        key = _CONTENT_KEY.match(buf, head.end())
+        if key is None or buf[key.end():key.end() + 1] != b'"':  # записи без строкового content
+            last = _FLAT_LAST.match(buf, head.end())
+            if last is None:
+                return None
+            self.pos = last.end()
+            return json.loads(buf[start:self.pos].decode('utf-8')), None, None
+        value_start = key.end()
+        value_end = _string_end(buf, value_start + 1) + 1
+        if value_end == 0:  # содержимое больше буфера - пусть его пропустит разбор по полям
+            return None
+        tail = _FLAT_TAIL.match(buf, value_end)
+        if tail is None:
+            return None
+        self.pos = tail.end()
+        # содержимое заменяем на null, чтобы не копировать и не раскодировать его
+        entry = json.loads((buf[start:value_start] + b'null' + buf[value_end:self.pos]).decode('utf-8'))
+        del entry['content']
+        crc = zlib.crc32(memoryview(buf)[value_start:value_end]) if self.checksums else None
+        return entry, (self.base + value_start, value_end - value_start), crc
+
+    def value(self):
+        """Произвольное значение JSON целиком"""
+        char = self.peek()
+        if char == b'"':
+            return self.string()
+        if char == b'{':
+            result = {}
+            for key in self.object_keys():
+                result[key] = self.value()
+            return result
+        if char == b'[':
+            return [self.value() for _ in self.array_items()]
+        return self.literal()
+
+    def object_keys(self):
+        """Перебор ключей объекта; значение после ключа читает вызывающий"""
+        self.expect(b'{')
+        if self.peek() == b'}':
+            self.pos += 1
+            return
+        while True:
+            key = self.string()
+            self.expect(b':')
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == b'}':
+                return
+            if char != b',':
+                self.pos -= 1
+                self.error("ожидалась ',' или '}'")
+
+    def array_items(self):
+        """Перебор элементов массива; сам элемент читает вызывающий"""
+        self.expect(b'[')
+        if self.peek() == b']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == b']':
+                return
+            if char != b',':
+                self.pos -= 1
+                self.error("ожидалась ',' или ']'")
+
+
+def _decode_literal(raw):
+    """Раскодирование строкового литерала JSON (вместе с кавычками)"""
+    if b'\\' not in raw:  # быстрый путь без escape-последовательностей
+        return raw[1:-1].decode('utf-8')
+    return json.loads(raw)
+
+
+def iter_json_entries(f, progress=None, checksums=False):
+    """Потоковый разбор образа: тройки (запись, место содержимого, crc) по разделу files.
+
+    Строковое поле content из записи убирается, вместо него отдается место
+    литерала в файле - (смещение, длина), само содержимое читается позже по
+    запросу; у записей без строкового content место None. С checksums третий
+    элемент - crc32 литерала, иначе None. Место передается отдельно от записи,
+    поэтому собственные поля образа с любыми именами не спутать со служебными.
+    """
+    scanner = _JSONScanner(f, progress, checksums)
+    if scanner.peek() != b'{':
+        scanner.error("образ VFS должен быть объектом JSON")
+    for key in scanner.object_keys():
+        if key != 'files':  # прочие разделы образа эмулятору не нужны
+            scanner.value()
+            continue
+        if scanner.peek() != b'[':
+            scanner.error("раздел files должен быть массивом")
+        for _ in scanner.array_items():
+            if scanner.peek() != b'{':  # не-объекты в files пропускаем
+                scanner.value()
+                continue
+            flat = scanner.flat_entry()
+            if flat is not None:
+                yield flat
+                continue
+            entry, ref, crc = {}, None, None  # запись с вложенными значениями или больше блока - разбираем по полям
+            for field in scanner.object_keys():
+                if field == 'content' and scanner.peek() == b'"':
+                    start, end = scanner.string_span(keep=False)
+                    ref = (start, end - start)
+                    entry.pop('content', None)  # при повторе ключа, как у json.loads, побеждает последний
+                    if checksums and hasattr(os, 'pread'):  # литерал больше буфера - дочитываем его отдельно
+                        crc = zlib.crc32(os.pread(f.fileno(), end - start, start))
+                else:
+                    if field == 'content':
+                        ref = crc = None
+                    entry[field] = scanner.value()
+            yield entry, ref, crc
+    if scanner.peek():
+        scanner.error("лишние данные после образа")
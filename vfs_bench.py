@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import vfs_search
+from shell_engine import ShellEngine
+from vfs_convert import json_to_pack
+from vfs_gen import write_image
+
+
+def percentiles(samples):
+    """p50/p90/p99 в микросекундах"""
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] / 1000
+    return {'p50_us': pick(0.5), 'p90_us': pick(0.9), 'p99_us': pick(0.99)}
+
+
+def measure(name, operation, args_list):
+    """Задержки операции по выборке аргументов и пиковая память отдельным проходом"""
+    timings = []
+    started = time.perf_counter()
+    for args in args_list:
+        t = time.perf_counter_ns()
+        operation(*args)
+        timings.append(time.perf_counter_ns() - t)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()  # отдельный проход, чтобы трассировка не искажала задержки
+    for args in args_list:
+        operation(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {'op': name, 'ops': len(args_list), 'ops_per_s': len(args_list) / elapsed if elapsed else 0.0,
+              'peak_kb': peak / 1024}
+    result.update(percentiles(timings))
+    return result
+
+
+def brute_du(vfs, path):
+    """du без итогов загрузки: обход поддерева с суммированием размеров"""
+    size = count = 0
+    for _, node in vfs.walk(path):
+        count += 1
+        if node.is_file:
+            size += vfs.file_size(node)
+    return size, count - 1
+
+
+def bench_search(vfs, dirs, files, grep_samples, rng):
+    """grep полным обходом против индекса n-грамм и du по итогам против обхода"""
+    results = []
+    t = time.perf_counter()
+    index = vfs_search.TrigramIndex.build(vfs)
+    build_time = time.perf_counter() - t
+    # tracemalloc замедляет построение в разы, поэтому память индекса считаем по размерам объектов
+    size = sys.getsizeof(index.postings) + sys.getsizeof(index.nodes) + sum(
+        sys.getsizeof(gram) + sys.getsizeof(posting) for gram, posting in index.postings.items())
+    results.append({'op': 'index_build', 'ops': 1, 'ops_per_s': 1 / build_time, 'peak_kb': size / 1024,
+                    'p50_us': build_time * 1e6, 'p90_us': build_time * 1e6, 'p99_us': build_time * 1e6})
+
+    patterns = []  # подстроки настоящих файлов, чтобы у запросов были совпадения
+    for _ in range(grep_samples):
+        text = vfs.decode_text(vfs.lookup(rng.choice(files)))
+        start = rng.randrange(max(1, len(text) - 8))
+        patterns.append((text[start:start + 8].strip() or 'abc',))
+    results.append(measure('grep_scan', lambda pattern: vfs_search.grep(vfs, pattern), patterns))
+    results.append(measure('grep_index', lambda pattern: vfs_search.grep(vfs, pattern, index=index), patterns))
+
+    roots = [(rng.choice(dirs),) for _ in range(grep_samples)]
+    results.append(measure('du_walk', lambda path: brute_du(vfs, path), roots))
+    results.append(measure('du_totals', lambda path: vfs.node(path).size, roots))
+    results.append(measure('find_glob', lambda path: vfs_search.find(vfs, path, 'f1*.txt'), roots))
+    return results
+
+
+def bench_size(image, samples, seed, grep_samples=0):
+    """Все замеры для одного образа"""
+    results = []
+    engine = ShellEngine(lambda message: None)  # вывод команд не нужен
+
+    t = time.perf_counter()
+    engine.load_vfs(image)
+    load_time = time.perf_counter() - t
+    engine.vfs_index.close()
+    tracemalloc.start()
+    engine.load_vfs(image)
+    retained, peak = tracemalloc.get_traced_memory()  # retained - то, что индекс держит после загрузки
+    tracemalloc.stop()
+    results.append({'op': 'load_vfs', 'ops': 1, 'ops_per_s': 1 / load_time, 'peak_kb': peak / 1024,
+                    'p50_us': load_time * 1e6, 'p90_us': load_time * 1e6, 'p99_us': load_time * 1e6,
+                    'bytes_per_entry': retained / (engine.vfs_index.root.count + 1)})
+
+    vfs = engine.vfs_index
+    rng = random.Random(seed)
+    nodes = list(vfs.walk('/'))
+    paths = [path for path, _ in nodes]
+    dirs = [path for path, node in nodes if node.children]
+    files = [path for path, node in nodes if node.encoding == 'base64']
+    del nodes
+    pick = lambda population: [(rng.choice(population),) for _ in range(samples)]
+
+    results.append(measure('find_in_vfs', engine.find_in_vfs, pick(paths)))
+    results.append(measure('list_directory', engine.list_directory, pick(dirs)))
+    results.append(measure('path_exists', engine.path_exists, pick(paths)))
+    results.append(measure('resolve_path', engine.resolve_path, [(path.rsplit('/', 1)[1] + '/../x',) for (path,) in pick(paths)]))
+    if files:
+        cat_args = [([path],) for (path,) in pick(files)]
+        max_bytes = vfs.content_cache.max_bytes
+        vfs.content_cache.max_bytes = 0  # холодный cat: каждый раз чтение и декодирование base64
+        results.append(measure('cat_base64', engine.cmd_cat, cat_args))
+        vfs.content_cache.max_bytes = max_bytes
+        results.append(measure('cat_base64_cached', engine.cmd_cat, cat_args))
+    if grep_samples and files:
+        results.extend(bench_search(vfs, dirs, files, grep_samples, rng))
+    vfs.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры горячих путей эмулятора на синтетических образах')
+    parser.add_argument('--sizes', type=str, default='1000,10000,100000',
+                        help='Размеры образов через запятую (например 1000,10000,100000,1000000)')
+    parser.add_argument('--samples', type=int, default=2000, help='Число операций каждого вида')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=10)
+    parser.add_argument('--content-size', type=int, default=256)
+    parser.add_argument('--base64-share', type=float, default=0.5)
+    parser.add_argument('--format', choices=['json', 'pack'], default='json', help='Формат образа')
+    parser.add_argument('--grep-samples', type=int, default=0,
+                        help='Число запросов grep/du/find; 0 - без замеров поиска (grep полным обходом медленный)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', type=str, help='Сохранить результаты в JSON для отслеживания регрессий')
+    args = parser.parse_args()
+
+    report = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in [int(value) for value in args.sizes.split(',')]:
+            image = os.path.join(workdir, f"vfs_{size}.json")
+            write_image(image, size, depth=args.depth, fanout=args.fanout, content_size=args.content_size,
+                        base64_share=args.base64_share, seed=args.seed)
+            if args.format == 'pack':
+                packed = os.path.join(workdir, f"vfs_{size}.vfsp")
+                json_to_pack(image, packed)
+                os.remove(image)
+                image = packed
+
+            print(f"=== {size} записей, {os.path.getsize(image) / 1e6:.1f} МБ ({args.format}) ===")
+            print(f"{'операция':<20}{'p50 мкс':>12}{'p90 мкс':>12}{'p99 мкс':>12}{'оп/с':>14}{'пик КБ':>12}")
+            for result in bench_size(image, args.samples, args.seed, args.grep_samples):
+                result['entries'] = size
+                report.append(result)
+                print(f"{result['op']:<20}{result['p50_us']:>12.1f}{result['p90_us']:>12.1f}{result['p99_us']:>12.1f}"
+                      f"{result['ops_per_s']:>14.0f}{result['peak_kb']:>12.1f}")
+                if 'bytes_per_entry' in result:
+                    print(f"{'  байт на запись':<20}{result['bytes_per_entry']:>12.0f}")
+            os.remove(image)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as out:
+            json.dump({'format': args.format, 'results': report}, out, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
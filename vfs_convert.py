@@ -0,0 +1,142 @@
+import argparse
+import base64
+import itertools
+import json
+import os
+import shutil
+import tempfile
+
+from vfs import (VFS, PACK_MAGIC, PACK_HEADER, PACK_RECORD, PACK_VERSION, PACK_NO_ID, PACK_ENCODINGS,
+                 PACK_IMPLICIT, PACK_HAS_DATA, PACK_LITERAL, VFSOperationError)
+
+
+def json_to_pack(src, dst):
+    """Конвертация JSON образа в бинарный: base64 раскодируется, данные пишутся как есть"""
+    vfs = VFS.load_json(src, cache_bytes=0)
+    try:
+        write_pack(vfs, dst)
+    finally:
+        vfs.close()
+
+
+def pack_to_json(src, dst):
+    """Обратная конвертация бинарного образа в JSON схему deep_vfs.json"""
+    vfs = VFS.load_pack(src, cache_bytes=0)
+    try:
+        write_json(vfs, dst)
+    finally:
+        vfs.close()
+
+
+def write_pack(vfs, dst):
+    """Запись текущего состояния VFS бинарным образом"""
+    # родитель - префикс ребенка, поэтому после сортировки всегда идет раньше
+    nodes = sorted(((node.path(), node) for node in vfs.iter_nodes()), key=lambda item: item[0])
+    ids = {node: i for i, (_, node) in enumerate(nodes)}
+    strings = bytearray()
+    records = []
+    motd_id = PACK_NO_ID
+    with tempfile.TemporaryFile() as data:  # данные копируются в конец файла после таблиц
+        for i, (path, node) in enumerate(nodes):
+            path_bytes = path.encode('utf-8')
+            path_off = len(strings)
+            strings += path_bytes
+            parent = PACK_NO_ID if node.parent is None else ids[node.parent]
+            kind = 1 if node.type == 'directory' else 0
+            if not node.explicit:  # неявная папка
+                records.append((path_off, len(path_bytes), path_off, 0, parent, kind, 0, PACK_IMPLICIT, 0, 0))
+                continue
+            name_bytes = str(node.entry_name).encode('utf-8')
+            name_off = len(strings)
+            strings += name_bytes
+            encoding = PACK_ENCODINGS.index(node.encoding) if node.encoding in PACK_ENCODINGS else 1
+            flags, data_off, data_len = 0, data.tell(), 0
+            if node.offset is not None or node.content is not None:
+                flags = PACK_HAS_DATA
+                try:
+                    payload = vfs.read_bytes(node)
+                except ValueError:  # неверный base64: эмулятор сообщает о нем только при cat, конвертер тоже не падает
+                    payload = vfs.read_content(node).encode('utf-8')
+                    flags |= PACK_LITERAL
+                data.write(payload)
+                data_len = len(payload)
+                if isinstance(payload, memoryview):  # срез mmap не должен мешать закрыть образ
+                    payload.release()
+            records.append((path_off, len(path_bytes), name_off, len(name_bytes), parent, kind, encoding, flags,
+                            data_off, data_len))
+            if node is vfs.motd:
+                motd_id = i
+
+        strings_offset = PACK_HEADER.size + len(records) * PACK_RECORD.size
+        data_offset = strings_offset + len(strings)
+        with open(dst, 'wb') as out:
+            out.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(records), motd_id, 0,
+                                       strings_offset, data_offset))
+            for record in records:
+                out.write(PACK_RECORD.pack(*record))
+            out.write(strings)
+            data.seek(0)
+            shutil.copyfileobj(data, out)
+
+
+def write_json(vfs, dst):
+    """Запись текущего состояния VFS в JSON схеме deep_vfs.json"""
+    with open(dst, 'w', encoding='utf-8') as out:
+        out.write('{\n  "files": [')
+        first = True
+        # обход дерева, дети в порядке добавления; motd первым, чтобы после загрузки он остался тем же
+        nodes = vfs.iter_nodes()
+        if vfs.motd is not None:
+            nodes = itertools.chain([vfs.motd], (node for node in nodes if node is not vfs.motd))
+        for node in nodes:
+            if not node.explicit:  # неявные папки в JSON не нужны
+                continue
+            record = node.entry()
+            if vfs.pack is not None and node.offset is not None:
+                with vfs.read_bytes(node) as data:
+                    if node.encoding == 'base64':
+                        record['content'] = base64.b64encode(data).decode('ascii')
+                    else:
+                        record['content'] = str(data, 'utf-8')
+            elif node.offset is not None or node.content is not None:  # литерал из исходного образа в том же виде
+                record['content'] = vfs.read_content(node)
+            out.write(('\n    ' if first else ',\n    ') + json.dumps(record, ensure_ascii=False))
+            first = False
+        out.write('\n  ]\n}\n')
+
+
+def compact(vfs):
+    """Свертка журнала: текущее состояние пишется новым базовым образом в том же формате"""
+    if vfs.read_only:  # образ разделен с другими сессиями или процессами
+        raise VFSOperationError("VFS открыта только для чтения")
+    new_image = vfs.image_path + '.compact'
+    try:
+        if vfs.pack is not None:
+            write_pack(vfs, new_image)
+        else:
+            write_json(vfs, new_image)
+        vfs.replace_base(new_image)
+    finally:
+        if os.path.exists(new_image):  # запись не удалась - старый образ и журнал не тронуты
+            os.remove(new_image)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Конвертация образа VFS между JSON и бинарным форматом')
+    parser.add_argument('src', help='Исходный образ (формат определяется по сигнатуре)')
+    parser.add_argument('dst', help='Файл результата')
+    args = parser.parse_args()
+
+    with open(args.src, 'rb') as f:
+        is_pack = f.read(len(PACK_MAGIC)) == PACK_MAGIC
+    if is_pack:
+        pack_to_json(args.src, args.dst)
+        print(f"Бинарный образ '{args.src}' сконвертирован в JSON '{args.dst}'")
+    else:
+        json_to_pack(args.src, args.dst)
+        print(f"JSON образ '{args.src}' сконвертирован в бинарный '{args.dst}'")
+    print(f"Размер: {os.path.getsize(args.src)} -> {os.path.getsize(args.dst)} байт")
+
+
+if __name__ == "__main__":
+    main()
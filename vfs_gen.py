@@ -0,0 +1,82 @@
+import argparse
+import base64
+import json
+import random
+import string
+
+
+def generate_entries(entries, depth=3, fanout=10, content_size=256, base64_share=0.5, seed=0):
+    """Записи синтетического образа в схеме deep_vfs.json.
+
+    Папки строятся в ширину: у каждой до fanout подпапок, не глубже depth уровней,
+    и не больше десятой части всех записей. Остальные записи - файлы, они
+    раскладываются по самым глубоким папкам по кругу.
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + ' \n'
+
+    dir_budget = max(1, entries // 10)
+    dirs = []  # пути созданных папок
+    level = ['']  # папки текущего уровня ('' - корень)
+    for _ in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(fanout):
+                if len(dirs) >= dir_budget:
+                    break
+                path = f"{parent}/d{i}"
+                dirs.append(path)
+                next_level.append(path)
+        if not next_level:
+            break
+        level = next_level
+
+    for path in dirs:
+        yield {'name': path.rsplit('/', 1)[1], 'type': 'directory', 'path': path}
+
+    leaves = level if dirs else ['']  # файлы кладем в самые глубокие папки
+    for i in range(entries - len(dirs)):
+        parent = leaves[i % len(leaves)]
+        size = max(0, int(content_size * rng.uniform(0.5, 1.5)))  # размер плавает вокруг заданного
+        text = ''.join(rng.choices(alphabet, k=size))
+        name = f"f{i}.txt"
+        entry = {'name': name, 'type': 'file', 'path': f"{parent}/{name}"}
+        if rng.random() < base64_share:
+            entry['content'] = base64.b64encode(text.encode('utf-8')).decode('ascii')
+            entry['encoding'] = 'base64'
+        else:
+            entry['content'] = text
+            entry['encoding'] = 'plain'
+        yield entry
+
+
+def write_image(path, entries, **kwargs):
+    """Потоковая запись образа в файл; возвращает число записей"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write('{\n  "files": [')
+        for entry in generate_entries(entries, **kwargs):
+            out.write(('\n    ' if count == 0 else ',\n    ') + json.dumps(entry, ensure_ascii=False))
+            count += 1
+        out.write('\n  ]\n}\n')
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор синтетических образов VFS')
+    parser.add_argument('output', help='Файл образа JSON')
+    parser.add_argument('--entries', type=int, default=1000, help='Общее число записей')
+    parser.add_argument('--depth', type=int, default=3, help='Глубина дерева папок')
+    parser.add_argument('--fanout', type=int, default=10, help='Число подпапок у каждой папки')
+    parser.add_argument('--content-size', type=int, default=256, help='Средний размер файла в символах')
+    parser.add_argument('--base64-share', type=float, default=0.5, help='Доля файлов в кодировке base64')
+    parser.add_argument('--seed', type=int, default=0, help='Зерно генератора случайных чисел')
+    args = parser.parse_args()
+
+    count = write_image(args.output, args.entries, depth=args.depth, fanout=args.fanout,
+                        content_size=args.content_size, base64_share=args.base64_share, seed=args.seed)
+    print(f"Образ '{args.output}': {count} записей")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import fnmatch
+import re
+from array import array
+
+GRAM = 3  # длина n-граммы индекса
+_REGEX_SPECIAL = set('.^$*+?{}[]\\|()')
+_ANCHORS = ('^', '$', '\\A', '\\Z')  # привязки к началу и концу строки
+
+
+class TrigramIndex:
+    """Инвертированный индекс триграмм по раскодированному содержимому файлов"""
+
+    def __init__(self):
+        self.nodes = []  # номер файла -> узел VFS; None у удаленных и перезаписанных файлов
+        self.ids = {}  # узел -> номер файла
+        self.postings = {}  # триграмма -> номера файлов по возрастанию
+
+    @classmethod
+    def build(cls, vfs, progress=None):
+        """Один проход по всем файлам образа; файлы, которые не декодируются, пропускаются"""
+        index = cls()
+        total = vfs.root.count + 1
+        for done, node in enumerate(vfs.iter_nodes(), 1):
+            if progress is not None and done % 65536 == 0:
+                progress(done / total)
+            if not node.is_file:
+                continue
+            try:
+                text = vfs.decode_text(node)  # мимо кэша: полный проход вытеснил бы из него все
+            except ValueError:  # битый base64 или не UTF-8
+                continue
+            index.add(node, text)
+        return index
+
+    def add(self, node, text):
+        """Добавление файла; прежнее содержимое того же узла перестает находиться"""
+        self.discard(node)
+        file_id = len(self.nodes)  # новые номера больше старых, списки остаются упорядоченными
+        self.nodes.append(node)
+        self.ids[node] = file_id
+        postings = self.postings
+        for gram in {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}:
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array('I')
+            posting.append(file_id)
+
+    def discard(self, node):
+        """Удаление файла из выдачи; его номера в списках остаются, но больше не отдаются"""
+        file_id = self.ids.pop(node, None)
+        if file_id is not None:
+            self.nodes[file_id] = None
+
+    def candidates(self, literal):
+        """Узлы файлов, которые могут содержать literal; None если индекс тут не поможет"""
+        if len(literal) < GRAM:
+            return None
+        lists = []
+        for gram in {literal[i:i + GRAM] for i in range(len(literal) - GRAM + 1)}:
+            posting = self.postings.get(gram)
+            if posting is None:  # такой триграммы нет ни в одном файле
+                return []
+            lists.append(posting)
+        lists.sort(key=len)  # пересечение начинаем с самого короткого списка
+        ids = set(lists[0])
+        for posting in lists[1:]:
+            if not ids:
+                break
+            ids.intersection_update(posting)
+        nodes = (self.nodes[file_id] for file_id in sorted(ids))
+        return [node for node in nodes if node is not None]
+
+    def stats(self):
+        return {'files': len(self.ids), 'grams': len(self.postings),
+                'postings': sum(len(posting) for posting in self.postings.values())}
+
+
+def find(vfs, root, name_glob=None, node_type=None):
+    """Пути поддерева root, чьи имена подходят под шаблон, в порядке обхода"""
+    match = re.compile(fnmatch.translate(name_glob)).match if name_glob else None
+    results = []
+    for path, node in vfs.walk(root):
+        if node_type is not None and node.kind != node_type:
+            continue
+        if match is None or match(node.name or '/'):
+            results.append(path)
+    return results
+
+
+def grep(vfs, pattern, root='/', index=None):
+    """Строки файлов поддерева root, где есть pattern: тройки (путь, номер строки, строка).
+
+    Если pattern - обычная строка без спецсимволов регулярных выражений и
+    передан индекс, читаются только файлы-кандидаты из индекса; иначе
+    раскодируется и просматривается каждый файл поддерева.
+    """
+    regex = re.compile(pattern)
+    # в тексте целиком ^ и $ совпадают только на краях файла, поэтому шаблоны с ними сразу идут по строкам
+    whole = None if any(anchor in pattern for anchor in _ANCHORS) else regex.search
+    nodes = None
+    if index is not None and not _REGEX_SPECIAL.intersection(pattern):
+        nodes = index.candidates(pattern)
+    if nodes is None:
+        files = [(path, node) for path, node in vfs.walk(root) if node.is_file]
+    else:
+        root_node = vfs.node(root)
+        files = [(node.path(), node) for node in nodes if node.within(root_node)]
+    files.sort(key=lambda file: file[0])  # порядок вывода не зависит от того, был ли индекс
+
+    results = []
+    for path, node in files:
+        try:
+            text = vfs.decode_text(node)
+        except ValueError:
+            continue
+        if whole is not None and whole(text) is None:  # большинство файлов отсеивается одним поиском
+            continue
+        for number, line in enumerate(text.splitlines(), 1):
+            if regex.search(line):
+                results.append((path, number, line))
+    return results